@@ -1,107 +1,490 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, status
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Query, Request, Header, status
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse, Response
 from app.schema import PostCreate, UserCreate, UserRead, UserUpdate
-from sqlalchemy import select, func
-from app.db import Post, create_db_and_tables, get_async_session, User, Comment, Like
+from sqlalchemy import select, func, update, insert, delete
+from app.db import Post, post_id_clause, create_db_and_tables, get_async_session, async_session_maker, engine, User, Comment, Like, Follow, TimelineEntry
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import selectinload
-from app.images import imagekit
+from sqlalchemy.exc import IntegrityError
 import shutil
 import os
 import uuid
 import tempfile
+import asyncio
+from starlette.concurrency import run_in_threadpool
 # from typing import Optional
-from app.users import auth_backend, current_active_user, fastapi_users, get_user_manager
+from app.users import auth_backend, current_active_user, current_superuser, fastapi_users, get_user_manager
+from app.compression import CompressionMiddleware
+from app.metrics import MetricsMiddleware, track_storage, render_metrics
+from app.passwords import auth_admission, shutdown_executor
+from app.uploads import (
+    STORAGE_BACKEND,
+    LOCAL_STORAGE_DIR,
+    create_upload_session,
+    decode_upload_session,
+    receive_local_upload,
+    resolve_uploaded_file,
+    store_file,
+    delete_stored_files,
+    MediaFiles,
+    ALLOWED_CONTENT_TYPES,
+    UPLOAD_MAX_BYTES,
+    UPLOAD_BATCH_MAX_FILES,
+    UPLOAD_BATCH_CONCURRENCY,
+)
+from app.profiling import ProfilingMiddleware, PROFILING_ENABLED, list_profiles, profile_path
+from app.search import search, SEARCH_KINDS
+from app.timeline import (
+    enqueue_fanout,
+    start_fanout_worker,
+    stop_fanout_worker,
+    backfill_follow,
+    remove_followee_entries,
+    read_timeline,
+)
+from app.trending import record_engagement, start_redecay_task, get_hot_posts
+from app.events import event_bus, parse_topics, post_topic, FEED_TOPIC
+from app.reaper import start_reaper_tasks
+from app.feed_head import feed_head, start_feed_head, read_feed_head, FEED_PAGE_SIZE
+from app.partitions import start_maintenance_task
+from app.ratelimit import RateLimit, UserRateLimit, AdmissionMiddleware, check_rate
+from app.transfer import parse_tables, export_ndjson, import_ndjson, iter_lines, TransferError
+from datetime import datetime, timezone
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    # main.py creates the schema once before forking workers and turns this off
+    if os.getenv("CREATE_SCHEMA_ON_STARTUP", "true").lower() == "true":
+        await create_db_and_tables()
+    await event_bus.start()
+    async with async_session_maker() as session:
+        await start_feed_head(session, serialize_post)
+    fanout_task = start_fanout_worker()
+    redecay_task = start_redecay_task()
+    reaper_tasks = start_reaper_tasks()
+    partition_task = start_maintenance_task(engine)
     yield
+    if partition_task:
+        partition_task.cancel()
+    for task in reaper_tasks:
+        task.cancel()
+    redecay_task.cancel()
+    await stop_fanout_worker(fanout_task)
+    await event_bus.stop()
+    shutdown_executor()
+    await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
-app.include_router(fastapi_users.get_auth_router(auth_backend), prefix='/auth/jwt', tags=["auth"])   
-app.include_router(fastapi_users.get_register_router(UserRead, UserCreate), prefix="/auth", tags=["auth"])
-app.include_router(fastapi_users.get_reset_password_router(), prefix="/auth", tags=["auth"])
+app.add_middleware(CompressionMiddleware)
+# Runs inside MetricsMiddleware so shed requests are still counted
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+if STORAGE_BACKEND == "local":
+    app.mount("/media", MediaFiles(directory=LOCAL_STORAGE_DIR, check_dir=False), name="media")
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+app.include_router(fastapi_users.get_auth_router(auth_backend), prefix='/auth/jwt', tags=["auth"], dependencies=[Depends(RateLimit("auth")), Depends(auth_admission)])   
+app.include_router(fastapi_users.get_register_router(UserRead, UserCreate), prefix="/auth", tags=["auth"], dependencies=[Depends(RateLimit("auth")), Depends(auth_admission)])
+app.include_router(fastapi_users.get_reset_password_router(), prefix="/auth", tags=["auth"], dependencies=[Depends(RateLimit("auth")), Depends(auth_admission)])
 app.include_router(fastapi_users.get_verify_router(UserRead), prefix="/auth", tags=["auth"])
 app.include_router(fastapi_users.get_users_router(UserRead, UserUpdate), prefix="/users", tags=["users"])
 
-@app.post("/upload")
+@app.post("/upload", dependencies=[Depends(UserRateLimit("upload"))])
 async def upload_file(
     file: UploadFile = File(...),
     caption: str = Form(""),
     user: User = Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session)
 ):
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported content type {file.content_type}")
+    
     try:
-        # Read file bytes
-        file_bytes = await file.read()
-        file.file.close()  # close the upload file
-        
-        upload_result = imagekit.files.upload(
-            file=file_bytes,
-            file_name=file.filename,
-            use_unique_file_name=True,
-            tags=["backend-upload"]
+        # Goes through store_file so STORAGE_BACKEND=local is honoured here too
+        try:
+            with track_storage("upload"):
+                stored = await run_in_threadpool(store_file, file.file, file.filename, file.content_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            await file.close()
+        
+        post = Post(
+            user_id=user.id,
+            username=user.username,
+            caption=caption,
+            **stored
         )
         
-        # Check if upload succeeded
-        if upload_result and getattr(upload_result, "file_id", None):
-            post = Post(
-                user_id=user.id,
-                username=user.username,
-                caption=caption,
-                url=upload_result.url,
-                file_type="video" if file.content_type.startswith("video/") else "image",
-                file_name=upload_result.name,
-                imagekit_file_id=upload_result.file_id
-            )
-            
-            session.add(post)
-            await session.commit()
-            await session.refresh(post)
-            return post
-        else:
-            raise HTTPException(status_code=500, detail="ImageKit upload failed")
+        session.add(post)
+        await session.commit()
+        await session.refresh(post)
+        await on_post_created(post)
+        return serialize_post(post)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/feed")
+@app.post("/uploads:batch")
+async def upload_batch(
+    request: Request,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    # Turn away users with no tokens left before reading the body, without spending any
+    await check_rate("upload_batch", f"user:{user.id}", charge=False)
+    # Parsed here rather than through File()/Form() params so the file limit
+    # stops the multipart parser instead of being checked after it finished
+    form = await request.form(max_files=UPLOAD_BATCH_MAX_FILES, max_fields=UPLOAD_BATCH_MAX_FILES + 10)
+    files = [item for item in form.getlist("files") if not isinstance(item, str)]
+    captions = [item for item in form.getlist("captions") if isinstance(item, str)]
+    if not files:
+        raise HTTPException(status_code=422, detail="No files uploaded")
+    # One token per file, charged only once the whole batch is known to fit
+    await check_rate("upload_batch", f"user:{user.id}", cost=len(files))
+    
+    results = [{"index": i, "file_name": file.filename, "ok": False} for i, file in enumerate(files)]
+    slots = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+    
+    async def transfer(i: int, file: UploadFile):
+        if file.content_type not in ALLOWED_CONTENT_TYPES:
+            results[i]["error"] = f"Unsupported content type {file.content_type}"
+            return None
+        if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+            results[i]["error"] = "File too large"
+            return None
+        try:
+            async with slots:
+                with track_storage("upload"):
+                    return await run_in_threadpool(store_file, file.file, file.filename, file.content_type)
+        except Exception as e:
+            results[i]["error"] = str(e)
+            return None
+        finally:
+            await file.close()
+    
+    stored = await asyncio.gather(*(transfer(i, file) for i, file in enumerate(files)))
+    
+    rows = [
+        {
+            "user_id": user.id,
+            "username": user.username,
+            "caption": captions[i] if i < len(captions) else "",
+            **fields,
+        }
+        for i, fields in enumerate(stored) if fields
+    ]
+    posts = []
+    if rows:
+        try:
+            # One multi-row INSERT for the whole album
+            posts = (await session.scalars(insert(Post).returning(Post), rows)).all()
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            await run_in_threadpool(delete_stored_files, [row["imagekit_file_id"] for row in rows])
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    by_file_id = {post.imagekit_file_id: post for post in posts}
+    for i, fields in enumerate(stored):
+        if fields:
+            post = by_file_id[fields["imagekit_file_id"]]
+            results[i].update(ok=True, post=serialize_post(post))
+            await on_post_created(post)
+    
+    return {"created": len(posts), "failed": len(files) - len(posts), "results": results}
+
+
+async def on_post_created(post: Post):
+    enqueue_fanout(post)
+    data = serialize_post(post)
+    # Applied here too so this worker's next read sees the post without waiting on the broker
+    feed_head.add(data)
+    await event_bus.publish(FEED_TOPIC, "post_created", data)
+
+
+@app.post("/uploads/session", dependencies=[Depends(UserRateLimit("upload"))])
+async def start_upload_session(
+    file_name: str = Form(...),
+    content_type: str = Form(...),
+    size: int | None = Form(None),
+    user: User = Depends(current_active_user),
+):
+    return create_upload_session(user.id, file_name, content_type, size)
+
+
+@app.put("/uploads/local/{session_id}", dependencies=[Depends(RateLimit("upload"))])
+async def local_upload(
+    session_id: str,
+    request: Request,
+    x_upload_session: str = Header(...),
+):
+    if STORAGE_BACKEND != "local":
+        raise HTTPException(status_code=404, detail="Not found")
+    return await receive_local_upload(session_id, x_upload_session, request)
+
+
+@app.post("/uploads/finalize", dependencies=[Depends(UserRateLimit("write"))])
+async def finalize_upload(
+    session_token: str = Form(...),
+    file_id: str | None = Form(None),
+    caption: str = Form(""),
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    claims = decode_upload_session(session_token, user.id)
+    stored = await resolve_uploaded_file(claims, file_id)
+    
+    existing = await session.execute(select(Post.id).where(Post.imagekit_file_id == stored["imagekit_file_id"]))
+    if existing.first():
+        raise HTTPException(status_code=409, detail="Upload already finalized")
+    
+    post = Post(user_id=user.id, username=user.username, caption=caption, **stored)
+    session.add(post)
+    try:
+        await session.commit()
+    except IntegrityError:
+        # A concurrent finalize of the same upload won the unique index
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Upload already finalized")
+    await session.refresh(post)
+    await on_post_created(post)
+    return serialize_post(post)
+
+
+@app.get("/feed", dependencies=[Depends(RateLimit("read"))])
 async def get_feed(
+    sort: str = Query("new"),
+    # Always paged, so the first pages are served from the in-memory feed head
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     session: AsyncSession = Depends(get_async_session),     
 ):
-    result = await session.execute(select(Post).order_by(Post.created_at.desc()))
-    posts = result.scalars().all()
+    if sort == "hot":
+        posts = await get_hot_posts(session, limit, offset)
+    elif sort == "new":
+        body = await read_feed_head(session, serialize_post, offset, limit)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+        result = await session.execute(
+            select(Post)
+            .where(Post.deleted_at.is_(None))
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        posts = result.scalars().all()
+    else:
+        raise HTTPException(status_code=400, detail="sort must be 'new' or 'hot'")
 
     posts_data = []
     for post in posts:
-        posts_data.append(
-            {
-                "id": str(post.id),
-                "username": post.username,
-                "caption": post.caption,
-                "url": post.url,
-                "file_type": post.file_type,
-                "file_name": post.file_name,
-                "created_at": post.created_at.isoformat(),
-                # "username": post.user.username,
-                # "email": post.user.email,
-            }
-        )
+        posts_data.append(serialize_post(post))
         
     return {"posts": posts_data}
+
+
+def serialize_post(post: Post):
+    return {
+        "id": str(post.id),
+        "username": post.username,
+        "caption": post.caption,
+        "url": post.url,
+        "file_type": post.file_type,
+        "file_name": post.file_name,
+        "created_at": post.created_at.isoformat(),
+        # "username": post.user.username,
+        # "email": post.user.email,
+    }
+
+
+@app.get("/timeline", dependencies=[Depends(UserRateLimit("read"))])
+async def get_timeline(
+    limit: int = Query(20, ge=1, le=100),
+    before: datetime | None = Query(None),
+    before_id: str | None = Query(None),
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        before_uuid = uuid.UUID(before_id) if before_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid before_id")
+    if before is not None and before_uuid is None:
+        raise HTTPException(status_code=400, detail="before_id is required with before")
     
+    posts = await read_timeline(session, user.id, limit, before, before_uuid)
+    
+    next_page = None
+    if len(posts) == limit:
+        last = posts[-1]
+        next_page = {"before": last.created_at.isoformat(), "before_id": str(last.id)}
+    
+    return {"posts": [serialize_post(post) for post in posts], "next": next_page}
+
 
-@app.delete("/posts/{post_id}")
+@app.post("/users/{user_id}/follow", dependencies=[Depends(UserRateLimit("follow"))])
+async def follow_user(
+    user_id: str,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        followee_uuid = uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if followee_uuid == user.id:
+        raise HTTPException(status_code=400, detail="You can't follow yourself")
+    
+    followee = await session.get(User, followee_uuid)
+    if not followee:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    result = await session.execute(
+        select(Follow).where((Follow.follower_id == user.id) & (Follow.followee_id == followee_uuid))
+    )
+    if result.scalars().first():
+        raise HTTPException(status_code=400, detail="You already follow this user")
+    
+    session.add(Follow(follower_id=user.id, followee_id=followee_uuid))
+    await session.execute(
+        update(User).where(User.id == followee_uuid).values(followers_count=User.followers_count + 1)
+    )
+    await backfill_follow(session, user.id, followee)
+    await session.commit()
+    
+    return {"success": True, "message": "User followed"}
+
+
+@app.delete("/users/{user_id}/follow", dependencies=[Depends(UserRateLimit("follow"))])
+async def unfollow_user(
+    user_id: str,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        followee_uuid = uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="You don't follow this user")
+    
+    result = await session.execute(
+        select(Follow).where((Follow.follower_id == user.id) & (Follow.followee_id == followee_uuid))
+    )
+    follow = result.scalars().first()
+    if not follow:
+        raise HTTPException(status_code=404, detail="You don't follow this user")
+    
+    await session.delete(follow)
+    await session.execute(
+        update(User).where(User.id == followee_uuid).values(followers_count=User.followers_count - 1)
+    )
+    await remove_followee_entries(session, user.id, followee_uuid)
+    await session.commit()
+    
+    return {"success": True, "message": "User unfollowed"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/profiles")
+async def get_profiles(user: User = Depends(current_superuser)):
+    return {"profiles": list_profiles()}
+
+
+@app.get("/admin/profiles/{name}")
+async def download_profile(name: str, user: User = Depends(current_superuser)):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+
+@app.get("/admin/export")
+async def export_data(tables: str | None = Query(None), user: User = Depends(current_superuser)):
+    try:
+        names = parse_tables(tables)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def body():
+        # Own session: the export outlives the request's dependencies
+        async with async_session_maker() as session:
+            async for chunk in export_ndjson(session, names):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="feedapp-export.ndjson"'},
+    )
+
+
+@app.post("/admin/import")
+async def import_data(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    rebuild_timelines: bool = Query(False),
+    session: AsyncSession = Depends(get_async_session),
+    user: User = Depends(current_superuser),
+):
+    try:
+        summary = await import_ndjson(session, iter_lines(request.stream()), skip=skip, rebuild=rebuild_timelines)
+    except TransferError as e:
+        # Resend the same body with ?skip=committed_lines to resume
+        raise HTTPException(status_code=400, detail={"error": str(e), "committed_lines": e.committed_lines})
+    feed_head.warm = False
+    return summary
+
+
+@app.get("/events")
+async def stream_events(request: Request, topics: str = Query(FEED_TOPIC)):
+    subscribed = parse_topics(topics)
+    if not subscribed:
+        raise HTTPException(status_code=400, detail="topics must be 'feed' and/or 'post:<id>'")
+    
+    subscription = event_bus.subscribe(subscribed)
+    return StreamingResponse(
+        event_bus.stream(subscription, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/search", dependencies=[Depends(RateLimit("read"))])
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str = Query("all"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if type not in SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(SEARCH_KINDS)}")
+    
+    try:
+        return await search(session, q, kind=type, limit=limit, cursor=cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+
+@app.delete("/posts/{post_id}", dependencies=[Depends(UserRateLimit("write"))])
 async def delete_post(post_id: str, session: AsyncSession = Depends(get_async_session), user: User = Depends(current_active_user),):
     
     try:
         post_uuid = uuid.UUID(post_id)
         
-        result = await session.execute(select(Post).where(Post.id == post_uuid))
+        result = await session.execute(select(Post).where(post_id_clause(post_uuid), Post.deleted_at.is_(None)))
         post = result.scalars().first()
         
         if not post:
@@ -110,11 +493,15 @@ async def delete_post(post_id: str, session: AsyncSession = Depends(get_async_se
         if post.user_id != user.id:
             raise HTTPException(status_code=403, detail="You don't have the permission to delete this post")
         
-        imagekit.files.delete(post.imagekit_file_id)
-        
-        await session.delete(post)
+        # Tombstone only; the reaper deletes the storage object and the rows in bulk
+        post.deleted_at = datetime.now(timezone.utc)
+        post.hot_score = 0.0
         await session.commit()
         
+        feed_head.remove(str(post_uuid))
+        await event_bus.publish(FEED_TOPIC, "post_deleted", {"id": str(post_uuid)})
+        await event_bus.publish(post_topic(post_uuid), "post_deleted", {"id": str(post_uuid)})
+        
         return {"sucess": True, "message": "Post deleted Sucessfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -129,15 +516,31 @@ async def delete_account(
 ):
     """Delete the current authenticated user's account."""
     try:
-        await session.delete(user)
+        username = user.username
+        now = datetime.now(timezone.utc)
+        # Posts become tombstones so the reaper deletes their storage objects along
+        # with their likes, comments and timeline rows, then the account itself
+        await session.execute(
+            update(Post)
+            .where(Post.user_id == user.id, Post.deleted_at.is_(None))
+            .values(deleted_at=now, hot_score=0.0)
+        )
+        # The user's own likes and comments have nothing in storage and go right away
+        await session.execute(delete(TimelineEntry).where(TimelineEntry.user_id == user.id))
+        await session.execute(delete(Like).where(Like.user_id == user.id))
+        await session.execute(delete(Comment).where(Comment.user_id == user.id))
+        user.deleted_at = now
+        user.is_active = False
         await session.commit()
+        feed_head.remove_user(username)
+        await event_bus.publish(FEED_TOPIC, "user_deleted", {"username": username})
         return None
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/posts/{post_id}/like")
+@app.post("/posts/{post_id}/like", dependencies=[Depends(UserRateLimit("like"))])
 async def like_post(
     post_id: str,
     user: User = Depends(current_active_user),
@@ -147,7 +550,7 @@ async def like_post(
         post_uuid = uuid.UUID(post_id)
         
         # Check if post exists
-        result = await session.execute(select(Post).where(Post.id == post_uuid))
+        result = await session.execute(select(Post).where(post_id_clause(post_uuid), Post.deleted_at.is_(None)))
         post = result.scalars().first()
         
         if not post:
@@ -167,15 +570,19 @@ async def like_post(
         # Create like
         like = Like(post_id=post_uuid, user_id=user.id)
         session.add(like)
+        counts = await record_engagement(session, post_uuid, likes=1)
         await session.commit()
         
+        if counts:
+            await event_bus.publish(post_topic(post_uuid), "likes", {"post_id": str(post_uuid), "likes_count": counts[0]})
+        
         return {"success": True, "message": "Post liked"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
-@app.delete("/posts/{post_id}/like")
+@app.delete("/posts/{post_id}/like", dependencies=[Depends(UserRateLimit("like"))])
 async def unlike_post(
     post_id: str,
     user: User = Depends(current_active_user),
@@ -196,14 +603,18 @@ async def unlike_post(
             raise HTTPException(status_code=404, detail="You haven't liked this post")
         
         await session.delete(like)
+        counts = await record_engagement(session, post_uuid, likes=-1)
         await session.commit()
         
+        if counts:
+            await event_bus.publish(post_topic(post_uuid), "likes", {"post_id": str(post_uuid), "likes_count": counts[0]})
+        
         return {"success": True, "message": "Post unliked"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/posts/{post_id}/likes")
+@app.get("/posts/{post_id}/likes", dependencies=[Depends(RateLimit("post_read"))])
 async def get_likes_count(
     post_id: str,
     session: AsyncSession = Depends(get_async_session)
@@ -222,7 +633,7 @@ async def get_likes_count(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/posts/{post_id}/user-like")
+@app.get("/posts/{post_id}/user-like", dependencies=[Depends(UserRateLimit("post_read"))])
 async def check_user_liked(
     post_id: str,
     user: User = Depends(current_active_user),
@@ -243,7 +654,7 @@ async def check_user_liked(
         return {"user_liked": False}
     
 
-@app.post("/posts/{post_id}/comment")
+@app.post("/posts/{post_id}/comment", dependencies=[Depends(UserRateLimit("comment"))])
 async def comment_post(
     post_id: str,
     content: str = Form(...),
@@ -254,7 +665,7 @@ async def comment_post(
         post_uuid = uuid.UUID(post_id)
         
         # Check if post exists
-        result = await session.execute(select(Post).where(Post.id == post_uuid))
+        result = await session.execute(select(Post).where(post_id_clause(post_uuid), Post.deleted_at.is_(None)))
         post = result.scalars().first()
         
         if not post:
@@ -268,20 +679,24 @@ async def comment_post(
             content=content
         )
         session.add(comment)
+        await record_engagement(session, post_uuid, comments=1)
         await session.commit()
         await session.refresh(comment)
         
-        return {
+        comment_data = {
             "id": str(comment.id),
             "username": comment.username,
             "content": comment.content,
             "created_at": comment.created_at.isoformat()
         }
+        await event_bus.publish(post_topic(post_uuid), "comment_created", {"post_id": str(post_uuid), **comment_data})
+        
+        return comment_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/posts/{post_id}/comments")
+@app.get("/posts/{post_id}/comments", dependencies=[Depends(RateLimit("post_read"))])
 async def get_post_comments(
     post_id: str,
     session: AsyncSession = Depends(get_async_session)
@@ -310,7 +725,7 @@ async def get_post_comments(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.delete("/comments/{comment_id}")
+@app.delete("/comments/{comment_id}", dependencies=[Depends(UserRateLimit("write"))])
 async def delete_comment(
     comment_id: str,
     user: User = Depends(current_active_user),
@@ -329,8 +744,13 @@ async def delete_comment(
             raise HTTPException(status_code=403, detail="You can only delete your own comments")
         
         await session.delete(comment)
+        await record_engagement(session, comment.post_id, comments=-1)
         await session.commit()
         
+        await event_bus.publish(
+            post_topic(comment.post_id), "comment_deleted", {"post_id": str(comment.post_id), "id": str(comment_uuid)}
+        )
+        
         return {"success": True, "message": "Comment deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,217 @@
+import gzip
+import os
+import time
+import logging
+from dotenv import load_dotenv
+
+# Optional (pip install zstandard brotli); without them responses are gzip only
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.compression")
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+
+# Media that is already compressed gains nothing from another pass
+SKIP_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/octet-stream",
+    "text/event-stream",
+)
+
+
+def _gzip(body: bytes, level: int) -> bytes:
+    return gzip.compress(body, compresslevel=max(1, min(level, 9)))
+
+
+def _zstd(body: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=max(1, min(level, 22))).compress(body)
+
+
+def _brotli(body: bytes, level: int) -> bytes:
+    return brotli.compress(body, quality=max(0, min(level, 11)))
+
+
+def available_encodings():
+    # Ordered by preference when the client accepts several
+    encoders = []
+    if zstandard is not None:
+        encoders.append(("zstd", _zstd))
+    if brotli is not None:
+        encoders.append(("br", _brotli))
+    encoders.append(("gzip", _gzip))
+    return encoders
+
+
+def parse_accept_encoding(header: str) -> tuple[set, set]:
+    """Split Accept-Encoding into the codings accepted and the ones refused with q=0."""
+    accepted, refused = set(), set()
+    for part in header.split(","):
+        token, *params = part.strip().split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        (accepted if quality > 0 else refused).add(token)
+    return accepted, refused
+
+
+def choose_encoding(accept_encoding: str):
+    accepted, refused = parse_accept_encoding(accept_encoding)
+    for name, encoder in available_encodings():
+        if name in accepted:
+            return name, encoder
+    # A bare wildcard says nothing about zstd/br support, so use the one every
+    # client decodes, unless it was refused explicitly (then send identity)
+    if "*" in accepted and "gzip" not in refused:
+        return "gzip", _gzip
+    return None, None
+
+
+class CompressionStats:
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.by_encoding = {}
+
+    def record(self, encoding: str, size_in: int, size_out: int, cpu_seconds: float):
+        self.responses += 1
+        self.bytes_in += size_in
+        self.bytes_out += size_out
+        self.cpu_seconds += cpu_seconds
+        self.by_encoding[encoding] = self.by_encoding.get(encoding, 0) + 1
+
+    def snapshot(self):
+        return {
+            "responses": self.responses,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": (self.bytes_in / self.bytes_out) if self.bytes_out else 0.0,
+            "cpu_seconds": self.cpu_seconds,
+            "by_encoding": dict(self.by_encoding),
+        }
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """Compress buffered responses with zstd, brotli or gzip depending on Accept-Encoding.
+
+    Streaming responses (more than one body chunk) are passed through untouched so
+    event streams and large downloads are never held in memory.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, level: int = COMPRESSION_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding, encoder = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers = dict(start_message.get("headers") or [])
+            content_type = response_headers.get(b"content-type", b"").decode("latin-1").lower()
+
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or b"content-encoding" in response_headers
+                or content_type.startswith(SKIP_CONTENT_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            cpu_start = time.process_time()
+            compressed = encoder(body, self.level)
+            cpu_seconds = time.process_time() - cpu_start
+
+            if len(compressed) >= len(body):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compression_stats.record(encoding, len(body), len(compressed), cpu_seconds)
+            logger.debug(
+                "%s %s compressed with %s: %d -> %d bytes (%.2fx) in %.2fms",
+                scope.get("method"), scope.get("path"), encoding,
+                len(body), len(compressed), len(body) / len(compressed), cpu_seconds * 1000,
+            )
+
+            new_headers = [
+                (k, v) for k, v in start_message.get("headers") or []
+                if k.lower() not in (b"content-length", b"vary")
+            ]
+            vary = response_headers.get(b"vary")
+            new_headers.append((b"vary", (vary + b", Accept-Encoding") if vary else b"Accept-Encoding"))
+            new_headers.append((b"content-encoding", encoding.encode("latin-1")))
+            new_headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+            new_headers.append((
+                b"x-compression-ratio",
+                f"{len(body) / len(compressed):.2f}".encode("latin-1"),
+            ))
+            new_headers.append((
+                b"server-timing",
+                f"compress;dur={cpu_seconds * 1000:.3f}".encode("latin-1"),
+            ))
+
+            await send({**start_message, "headers": new_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,13 +1,27 @@
 import uuid
+import fcntl
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import Depends
 from collections.abc import AsyncGenerator
 from datetime import datetime
 from datetime import timezone
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, UniqueConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, DateTime, Integer, Float, ForeignKey, UniqueConstraint, Index, text, and_, inspect
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.dialects.postgresql import UUID, insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, relationship
 from fastapi_users.db import SQLAlchemyUserDatabase, SQLAlchemyBaseUserTableUUID
+from app.search import setup_search
+from app.metrics import instrument_engine
+from app.partitions import (
+    PARTITIONING,
+    post_id_default,
+    post_created_at_default,
+    created_at_hint,
+    ensure_partitions,
+)
 
 import os
 from dotenv import load_dotenv
@@ -20,36 +34,77 @@ class Base(DeclarativeBase):
     pass
 
 
+def post_fk():
+    # Foreign keys can't point at partitioned posts (its key includes created_at)
+    return () if PARTITIONING else (ForeignKey("posts.id", ondelete="CASCADE"),)
+
+
+def partition_args(partition_by: str):
+    return {"postgresql_partition_by": partition_by} if PARTITIONING else {}
+
+
 class Like(Base):
     __tablename__ = "likes"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    # Part of the key when partitioned: every unique constraint must include post_id
+    post_id = Column(UUID(as_uuid=True), *post_fk(), nullable=False, primary_key=PARTITIONING)
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
-    post = relationship("Post", back_populates="likes")
+    post = relationship("Post", back_populates="likes", primaryjoin="Post.id == foreign(Like.post_id)")
     user = relationship("User", back_populates="likes")
     
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='unique_post_user_like'),)
+    __table_args__ = (
+        UniqueConstraint('post_id', 'user_id', name='unique_post_user_like'),
+        partition_args("HASH (post_id)"),
+    )
 
 
 class Comment(Base):
     __tablename__ = "comments"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    post_id = Column(UUID(as_uuid=True), *post_fk(), nullable=False, primary_key=PARTITIONING)
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
     username = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
-    post = relationship("Post", back_populates="comments")
+    post = relationship("Post", back_populates="comments", primaryjoin="Post.id == foreign(Comment.post_id)")
     user = relationship("User", back_populates="comments")
     
+    __table_args__ = (partition_args("HASH (post_id)"),)
+
+
+class Follow(Base):
+    __tablename__ = "follows"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    follower_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    followee_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (UniqueConstraint('follower_id', 'followee_id', name='unique_follower_followee'),)
+
+
+class TimelineEntry(Base):
+    __tablename__ = "timeline_entries"
+    
+    # Materialized home timeline row: one per (reader, post), written by the fan-out worker
+    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, primary_key=True)
+    post_id = Column(UUID(as_uuid=True), *post_fk(), primary_key=True, index=True)
+    author_id = Column(UUID(as_uuid=True), nullable=False)
+    
+    __table_args__ = (Index('ix_timeline_user_author', 'user_id', 'author_id'),)
+
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
     username = Column(String, unique=True, nullable=False, index=True)
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set when the account is deleted; the reaper removes the row once its posts are purged
+    deleted_at = Column(DateTime, nullable=True)
     posts = relationship("Post", back_populates="user")    
     likes = relationship("Like", back_populates="user")
     comments = relationship("Comment", back_populates="user")
@@ -57,26 +112,148 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
 class Post(Base):
     __tablename__ = "posts"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=post_id_default if PARTITIONING else uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
     username = Column(String, nullable=False)  # Add this
-    imagekit_file_id = Column(String, nullable=False)
+    # One post per stored object. Unique indexes on partitioned posts must include
+    # created_at, so there finalize's existence check is the only guard
+    imagekit_file_id = Column(String, nullable=False, index=True, unique=not PARTITIONING)
     caption = Column(Text)
     url = Column(String, nullable = False)
     file_type = Column(String, nullable = False)
     file_name = Column(String, nullable = False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(
+        DateTime,
+        default=post_created_at_default if PARTITIONING else lambda: datetime.now(timezone.utc),
+        index=True,
+        # The monthly range partition key has to be part of the primary key
+        primary_key=PARTITIONING,
+        nullable=not PARTITIONING,
+    )
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+    hot_score = Column(Float, nullable=False, default=0.0, server_default="0")
+    # Set on delete; the reaper removes the storage object and the row later
+    deleted_at = Column(DateTime, nullable=True)
+    # Reaper bookkeeping: which pass owns the tombstone and how often it was tried
+    reap_claim = Column(String, nullable=True)
+    reap_claimed_at = Column(DateTime, nullable=True)
+    reap_attempts = Column(Integer, nullable=False, default=0, server_default="0")
     
     user = relationship("User", back_populates="posts")
-    likes = relationship("Like", back_populates="post", cascade="all, delete-orphan")
-    comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
+    likes = relationship(
+        "Like", back_populates="post", cascade="all, delete-orphan", primaryjoin="Post.id == foreign(Like.post_id)"
+    )
+    comments = relationship(
+        "Comment", back_populates="post", cascade="all, delete-orphan", primaryjoin="Post.id == foreign(Comment.post_id)"
+    )
+    
+    __table_args__ = (
+        Index('ix_posts_user_created', 'user_id', 'created_at'),
+        Index('ix_posts_hot_score', 'hot_score', 'id'),
+        # Partial indexes: the feed only scans live posts, the reaper only tombstones
+        Index(
+            'ix_posts_live_created', 'created_at',
+            sqlite_where=text('deleted_at IS NULL'), postgresql_where=text('deleted_at IS NULL'),
+        ),
+        Index(
+            'ix_posts_tombstones', 'deleted_at',
+            sqlite_where=text('deleted_at IS NOT NULL'), postgresql_where=text('deleted_at IS NOT NULL'),
+        ),
+        partition_args("RANGE (created_at)"),
+    )
+
+
+def post_id_clause(post_id):
+    """Post.id == post_id, bounded by created_at on partitioned deployments so one partition is probed."""
+    return and_(Post.id == post_id, created_at_hint(Post.created_at, post_id))
 
 engine = create_async_engine(DATABASE_URL)
+instrument_engine(engine)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+def insert_ignoring_conflicts(session: AsyncSession, table):
+    """INSERT that skips rows whose key already exists instead of failing the transaction."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql_insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing()
+    return table.insert()
+
+
+@asynccontextmanager
+async def leader_lock(name: str):
+    """Yield True in exactly one process (per database on Postgres, per host otherwise).
+
+    Held for the whole block, across any commits the job makes inside it.
+    """
+    if engine.dialect.name == "postgresql":
+        # A session-level lock on a connection of its own, so the job's own
+        # transactions don't release it
+        async with engine.connect() as conn:
+            acquired = (
+                await conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": name})
+            ).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": name})
+        return
+
+    with open(os.path.join(tempfile.gettempdir(), f"feedapp-{name}.lock"), "w") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# Counters added to tables that already had rows start from the real counts
+COLUMN_BACKFILL = {
+    ("posts", "likes_count"): "UPDATE posts SET likes_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)",
+    ("posts", "comments_count"): (
+        "UPDATE posts SET comments_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id)"
+    ),
+}
+
+
+def add_missing_columns(conn):
+    """Bring tables created by an older version up to date; create_all only creates missing tables.
+
+    Every column added since has a server default or is nullable, so it can be
+    added in place. Indexes on the new columns are created alongside.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        for column in missing:
+            conn.execute(text(
+                f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} "
+                f"ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"
+            ))
+            if (table.name, column.name) in COLUMN_BACKFILL:
+                conn.execute(text(COLUMN_BACKFILL[table.name, column.name]))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        if PARTITIONING:
+            await ensure_partitions(conn)
+        await conn.run_sync(setup_search)
         
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
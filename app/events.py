@@ -0,0 +1,187 @@
+import os
+import json
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional, only needed for multi-worker fan-out
+    aioredis = None
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.events")
+
+EVENT_BROKER_URL = os.getenv("EVENT_BROKER_URL", "")
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+# A subscriber that has had this many events dropped is disconnected
+EVENT_MAX_DROPPED = int(os.getenv("EVENT_MAX_DROPPED", "500"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+EVENT_CHANNEL = "feedapp:events"
+
+FEED_TOPIC = "feed"
+MAX_TOPICS = 100
+
+
+def post_topic(post_id) -> str:
+    return f"post:{post_id}"
+
+
+def parse_topics(raw: str) -> set:
+    topics = set()
+    for topic in raw.split(","):
+        topic = topic.strip()
+        if topic == FEED_TOPIC or (topic.startswith("post:") and len(topic) > 5):
+            topics.add(topic)
+    return set(list(topics)[:MAX_TOPICS])
+
+
+class Subscription:
+    def __init__(self, topics: set, maxsize: int = EVENT_QUEUE_SIZE):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, message: dict):
+        if self.closed:
+            return
+        # Slow consumer: drop the oldest event rather than block publishers
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped >= EVENT_MAX_DROPPED:
+                self.closed = True
+                return
+        self.queue.put_nowait(message)
+
+
+class Broker(ABC):
+    """Moves published events to every worker; each worker then fans out locally."""
+
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    @abstractmethod
+    async def publish(self, message: dict):
+        """Hand a message to every worker's deliver callback, including this one's."""
+
+    async def stop(self):
+        pass
+
+
+class InProcessBroker(Broker):
+    async def publish(self, message: dict):
+        self.deliver(message)
+
+
+class RedisBroker(Broker):
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("redis is required for EVENT_BROKER_URL=redis://...")
+        self.url = url
+
+    async def start(self, deliver):
+        await super().start(deliver)
+        self.client = aioredis.from_url(self.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(EVENT_CHANNEL)
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            try:
+                async for item in self.pubsub.listen():
+                    if item.get("type") == "message":
+                        self.deliver(json.loads(item["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis event reader failed, reconnecting")
+                await asyncio.sleep(1)
+
+    async def publish(self, message: dict):
+        await self.client.publish(EVENT_CHANNEL, json.dumps(message))
+
+    async def stop(self):
+        self.reader.cancel()
+        await self.pubsub.close()
+        await self.client.close()
+
+
+def create_broker(url: str = EVENT_BROKER_URL) -> Broker:
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    return InProcessBroker()
+
+
+class EventBus:
+    def __init__(self, broker: Broker | None = None):
+        self.broker = broker or InProcessBroker()
+        self.subscriptions: dict[str, set] = {}
+        # In-process consumers called synchronously for every event on a topic
+        self.listeners: dict[str, list] = {}
+
+    async def start(self):
+        await self.broker.start(self.dispatch)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    def subscribe(self, topics: set) -> Subscription:
+        subscription = Subscription(topics)
+        for topic in topics:
+            self.subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.closed = True
+        for topic in subscription.topics:
+            subscribers = self.subscriptions.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscriptions[topic]
+
+    def add_listener(self, topic: str, callback):
+        self.listeners.setdefault(topic, []).append(callback)
+
+    def dispatch(self, message: dict):
+        for callback in self.listeners.get(message["topic"], ()):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Event listener failed on %s", message["topic"])
+        for subscription in list(self.subscriptions.get(message["topic"], ())):
+            subscription.offer(message)
+
+    async def publish(self, topic: str, type: str, data: dict):
+        try:
+            await self.broker.publish({"topic": topic, "type": type, "data": data})
+        except Exception:
+            # Events are best effort; never fail the write that triggered them
+            logger.exception("Failed to publish %s event on %s", type, topic)
+
+    async def stream(self, subscription: Subscription, request):
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.closed:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                payload = json.dumps({"topic": message["topic"], **message["data"]})
+                yield f"event: {message['type']}\ndata: {payload}\n\n"
+            if subscription.dropped >= EVENT_MAX_DROPPED:
+                yield "event: overflow\ndata: {}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+event_bus = EventBus(create_broker())
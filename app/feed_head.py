@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import Post
+from app.events import event_bus, FEED_TOPIC
+
+load_dotenv()
+
+FEED_HEAD_ENABLED = os.getenv("FEED_HEAD_ENABLED", "true").lower() == "true"
+FEED_HEAD_SIZE = int(os.getenv("FEED_HEAD_SIZE", "200"))
+# Page size when /feed is called without a limit; keep it below FEED_HEAD_SIZE
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "20"))
+# Safety net for missed notifications (e.g. several workers without a shared broker)
+FEED_HEAD_MAX_AGE_SECONDS = float(os.getenv("FEED_HEAD_MAX_AGE_SECONDS", "60"))
+
+
+def _sort_time(value: str) -> datetime:
+    created_at = datetime.fromisoformat(value)
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at
+
+
+class HeadEntry:
+    __slots__ = ("key", "id", "username", "body")
+
+    def __init__(self, data: dict):
+        self.id = data["id"]
+        self.username = data["username"]
+        self.key = (_sort_time(data["created_at"]), self.id)
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+
+
+class FeedHead:
+    """The newest posts of the "new" feed, kept oldest first and served newest first."""
+
+    def __init__(self, size: int = FEED_HEAD_SIZE):
+        self.size = size
+        self.keys: list = []
+        self.entries: list[HeadEntry] = []
+        self.ids: set = set()
+        # True while the window holds every live post, so any page can be served
+        self.complete = False
+        self.warm = False
+        self.warmed_at = 0.0
+        self.lock = asyncio.Lock()
+        self.pending: list | None = None
+
+    async def load(self, session: AsyncSession, serialize):
+        async with self.lock:
+            # Changes that land while the query runs are replayed on top of it
+            self.pending = []
+            try:
+                result = await session.execute(
+                    select(Post)
+                    .where(Post.deleted_at.is_(None))
+                    .order_by(Post.created_at.desc(), Post.id.desc())
+                    .limit(self.size)
+                )
+                posts = result.scalars().all()
+                self.keys, self.entries, self.ids = [], [], set()
+                for post in reversed(posts):
+                    self._add(HeadEntry(serialize(post)))
+                self.complete = len(posts) < self.size
+                for op, arg in self.pending:
+                    op(arg)
+            finally:
+                self.pending = None
+            self.warm = True
+            self.warmed_at = time.monotonic()
+
+    def _add(self, entry: HeadEntry):
+        if entry.id in self.ids:
+            return
+        index = bisect.bisect(self.keys, entry.key)
+        if index == 0 and len(self.entries) >= self.size:
+            return  # older than everything in a full window
+        self.keys.insert(index, entry.key)
+        self.entries.insert(index, entry)
+        self.ids.add(entry.id)
+        if len(self.entries) > self.size:
+            self.ids.discard(self.entries[0].id)
+            del self.keys[0], self.entries[0]
+            self.complete = False
+
+    def _remove(self, match):
+        keep = [i for i, entry in enumerate(self.entries) if not match(entry)]
+        if len(keep) == len(self.entries):
+            return
+        self.entries = [self.entries[i] for i in keep]
+        self.keys = [self.keys[i] for i in keep]
+        self.ids = {entry.id for entry in self.entries}
+
+    def _remove_post(self, post_id: str):
+        if post_id in self.ids:
+            self._remove(lambda entry: entry.id == post_id)
+
+    def _remove_user(self, username: str):
+        self._remove(lambda entry: entry.username == username)
+
+    def _apply(self, op, arg):
+        if self.pending is not None:
+            self.pending.append((op, arg))
+        op(arg)
+
+    def add(self, data: dict):
+        self._apply(self._add, HeadEntry(data))
+
+    def remove(self, post_id: str):
+        self._apply(self._remove_post, post_id)
+
+    def remove_user(self, username: str):
+        self._apply(self._remove_user, username)
+
+    def on_event(self, message: dict):
+        data = message["data"]
+        if message["type"] == "post_created":
+            self.add(data)
+        elif message["type"] == "post_deleted":
+            self.remove(data["id"])
+        elif message["type"] == "user_deleted":
+            self.remove_user(data["username"])
+
+    def covers(self, offset: int, limit: int | None) -> bool:
+        if self.complete:
+            return True
+        return limit is not None and offset + limit <= len(self.entries)
+
+    def needs_load(self, offset: int, limit: int | None) -> bool:
+        if not self.warm or time.monotonic() - self.warmed_at > FEED_HEAD_MAX_AGE_SECONDS:
+            return True
+        # Deletes shrank the window below what this page needs; top it up
+        return not self.covers(offset, limit) and limit is not None and offset + limit <= self.size
+
+    def page(self, offset: int, limit: int | None) -> bytes | None:
+        if not self.warm or not self.covers(offset, limit):
+            return None
+        end = len(self.entries) - offset
+        start = 0 if limit is None else max(end - limit, 0)
+        bodies = [entry.body for entry in reversed(self.entries[start:max(end, 0)])]
+        return b'{"posts":[' + b",".join(bodies) + b"]}"
+
+
+feed_head = FeedHead()
+
+
+async def start_feed_head(session: AsyncSession, serialize):
+    if not FEED_HEAD_ENABLED:
+        return
+    # Every worker hears every post_created/post_deleted through the event bus
+    event_bus.add_listener(FEED_TOPIC, feed_head.on_event)
+    await feed_head.load(session, serialize)
+
+
+async def read_feed_head(session: AsyncSession, serialize, offset: int, limit: int | None) -> bytes | None:
+    if not FEED_HEAD_ENABLED:
+        return None
+    if feed_head.needs_load(offset, limit) and not feed_head.lock.locked():
+        await feed_head.load(session, serialize)
+    return feed_head.page(offset, limit)
@@ -0,0 +1,216 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+from app.compression import compression_stats
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.metrics")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# More queries than this in one request usually means an N+1 pattern
+QUERY_WARN_THRESHOLD = int(os.getenv("QUERY_WARN_THRESHOLD", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, (counts, total, count) in sorted(self.series.items()):
+                base = _labels(label_names, labels)
+                sep = "," if base else ""
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{base}}} {total}")
+                lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, type: str = "counter"):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), value: float = 1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            for labels, value in sorted(self.series.items()):
+                base = _labels(label_names, labels)
+                lines.append(f"{self.name}{{{base}}} {value}" if base else f"{self.name} {value}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+request_latency = Histogram("http_request_duration_seconds", "Request latency by route", LATENCY_BUCKETS)
+request_queries = Histogram("http_request_db_queries", "DB queries issued per request", QUERY_COUNT_BUCKETS)
+request_total = Counter("http_requests_total", "Requests by route and status")
+requests_in_flight = Counter("http_requests_in_flight", "Requests currently being served", type="gauge")
+db_queries_total = Counter("db_queries_total", "SQL statements executed")
+db_seconds_total = Counter("db_query_seconds_total", "Time spent executing SQL")
+storage_calls_total = Counter("storage_calls_total", "Storage backend calls by operation and outcome")
+storage_latency = Histogram("storage_call_duration_seconds", "Storage backend call latency", LATENCY_BUCKETS)
+rate_limited_total = Counter("http_rate_limited_total", "Requests rejected with 429 by rate limit budget")
+admission_rejected_total = Counter("http_admission_rejected_total", "Requests shed with 503 by reason")
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "storage_calls", "storage_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.storage_calls = 0
+        self.storage_seconds = 0.0
+
+
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+
+def instrument_engine(engine):
+    # Async engines run these hooks on the sync engine inside the request's context
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        db_queries_total.inc()
+        db_seconds_total.inc(value=elapsed)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+@contextmanager
+def track_storage(operation: str):
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        storage_calls_total.inc((operation, outcome))
+        storage_latency.observe((operation,), elapsed)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.storage_calls += 1
+            stats.storage_seconds += elapsed
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        requests_in_flight.inc(value=1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.inc(value=-1)
+            current_request_stats.reset(token)
+
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope.get("method", "")
+            request_latency.observe((method, path), elapsed)
+            request_queries.observe((method, path), stats.queries)
+            request_total.inc((method, path, status_code))
+
+            if elapsed * 1000 >= SLOW_REQUEST_MS or stats.queries > QUERY_WARN_THRESHOLD:
+                logger.warning(
+                    "Slow request %s %s -> %s in %.1fms (%d queries, %.1fms db, %d storage calls, %.1fms storage)",
+                    method, scope.get("path"), status_code, elapsed * 1000,
+                    stats.queries, stats.db_seconds * 1000,
+                    stats.storage_calls, stats.storage_seconds * 1000,
+                )
+
+
+def render_metrics() -> str:
+    lines = []
+    lines += request_latency.render(("method", "route"))
+    lines += request_queries.render(("method", "route"))
+    lines += request_total.render(("method", "route", "status"))
+    lines += requests_in_flight.render(())
+    lines += db_queries_total.render(())
+    lines += db_seconds_total.render(())
+    lines += storage_calls_total.render(("operation", "outcome"))
+    lines += storage_latency.render(("operation",))
+    lines += rate_limited_total.render(("budget",))
+    lines += admission_rejected_total.render(("reason",))
+
+    compression = compression_stats.snapshot()
+    lines += [
+        "# HELP http_compression_bytes_in_total Response bytes before compression",
+        "# TYPE http_compression_bytes_in_total counter",
+        f"http_compression_bytes_in_total {compression['bytes_in']}",
+        "# HELP http_compression_bytes_out_total Response bytes after compression",
+        "# TYPE http_compression_bytes_out_total counter",
+        f"http_compression_bytes_out_total {compression['bytes_out']}",
+        "# HELP http_compression_cpu_seconds_total CPU time spent compressing responses",
+        "# TYPE http_compression_cpu_seconds_total counter",
+        f"http_compression_cpu_seconds_total {compression['cpu_seconds']}",
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,186 @@
+"""Experimental Postgres partitioning for the big tables.
+
+Not covered by any test against a real Postgres server yet, so it stays off
+unless EXPERIMENTAL_POSTGRES_PARTITIONING=true is set explicitly.
+
+With EXPERIMENTAL_POSTGRES_PARTITIONING=true (and a postgresql DATABASE_URL) the schema is
+created with posts range-partitioned by month on created_at and likes/comments
+hash-partitioned by post_id. Partitioned tables can't be referenced by foreign
+keys unless the key includes the partition column, so in this mode the
+posts foreign keys are dropped and the app (the reaper) keeps children
+consistent instead.
+
+Post ids are UUIDv7 in this mode, so a lookup by id can also bound created_at
+and touch a single partition. Switching an existing database over means
+exporting with app.transfer and importing into a fresh schema.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import text, true, and_
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.partitions")
+
+PARTITIONING = (
+    os.getenv("EXPERIMENTAL_POSTGRES_PARTITIONING", "false").lower() == "true"
+    and os.getenv("DATABASE_URL", "").startswith("postgresql")
+)
+if PARTITIONING:
+    logger.warning("EXPERIMENTAL_POSTGRES_PARTITIONING is on; this schema layout is untested, don't use it for data you can't restore")
+POSTS_PARTITION_MONTHS_AHEAD = int(os.getenv("POSTS_PARTITION_MONTHS_AHEAD", "3"))
+# 0 keeps every month; otherwise older monthly partitions are retired
+POSTS_RETENTION_MONTHS = int(os.getenv("POSTS_RETENTION_MONTHS", "0"))
+# "detach" keeps retired months as standalone tables for archiving, "drop" deletes them
+POSTS_RETIRE_MODE = os.getenv("POSTS_RETIRE_MODE", "detach")
+ENGAGEMENT_HASH_PARTITIONS = int(os.getenv("ENGAGEMENT_HASH_PARTITIONS", "16"))
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", "21600"))
+
+HASH_PARTITIONED_TABLES = ("likes", "comments")
+# Children that reference posts by id; cleaned up when a month is retired
+POST_CHILD_TABLES = ("likes", "comments", "timeline_entries")
+MAINTENANCE_LOCK_KEY = 0x46454544  # pg_advisory_xact_lock key shared by all workers
+
+
+def uuid7(at: datetime | None = None) -> uuid.UUID:
+    if at is None:
+        millis = time.time_ns() // 1_000_000
+    else:
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        millis = int(at.timestamp() * 1000)
+    value = (millis & ((1 << 48) - 1)) << 80
+    value |= int.from_bytes(os.urandom(10), "big") & ((1 << 80) - 1)
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # variant
+    return uuid.UUID(int=value)
+
+
+def uuid7_time(value) -> datetime | None:
+    if not isinstance(value, uuid.UUID) or value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, timezone.utc)
+
+
+def post_id_default(context):
+    # Derived from an explicit created_at (seeding, imports) so id and partition agree
+    return uuid7(context.get_current_parameters().get("created_at"))
+
+
+def post_created_at_default(context):
+    return uuid7_time(context.get_current_parameters().get("id")) or datetime.now(timezone.utc)
+
+
+def created_at_hint(created_at_column, post_id):
+    """A created_at range implied by a UUIDv7 post id, letting Postgres prune to one partition."""
+    if not PARTITIONING:
+        return true()
+    created_at = uuid7_time(post_id)
+    if created_at is None:
+        return true()
+    return and_(
+        created_at_column >= created_at - timedelta(seconds=1),
+        created_at_column < created_at + timedelta(seconds=1),
+    )
+
+
+def _month_start(day: datetime, offset: int = 0) -> datetime:
+    month = day.year * 12 + day.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def _month_name(start: datetime) -> str:
+    return f"posts_y{start.year:04d}m{start.month:02d}"
+
+
+async def ensure_partitions(conn, now: datetime | None = None):
+    """Create the hash partitions, the default partition and the upcoming months; retire old months."""
+    now = now or datetime.now(timezone.utc)
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+
+    for table in HASH_PARTITIONED_TABLES:
+        for remainder in range(ENGAGEMENT_HASH_PARTITIONS):
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table}_p{remainder:02d} PARTITION OF {table} "
+                f"FOR VALUES WITH (MODULUS {ENGAGEMENT_HASH_PARTITIONS}, REMAINDER {remainder})"
+            ))
+
+    # Catches rows no monthly partition covers, e.g. imported history
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS posts_default PARTITION OF posts DEFAULT"))
+    for offset in range(POSTS_PARTITION_MONTHS_AHEAD + 1):
+        await create_month_partition(conn, _month_start(now, offset))
+
+    if POSTS_RETENTION_MONTHS > 0:
+        await retire_partitions(conn, _month_start(now, -POSTS_RETENTION_MONTHS))
+
+
+async def create_month_partition(conn, start: datetime):
+    name = _month_name(start)
+    if (await conn.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar() is not None:
+        return
+    bounds = f"FROM ('{start.isoformat()}') TO ('{_month_start(start, 1).isoformat()}')"
+    in_range = f"created_at >= '{start.isoformat()}' AND created_at < '{_month_start(start, 1).isoformat()}'"
+
+    # Postgres refuses to create a partition while the default partition holds
+    # rows in its range, so those rows are moved into the new table first
+    stranded = (await conn.execute(text(f"SELECT count(*) FROM posts_default WHERE {in_range}"))).scalar()
+    if not stranded:
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF posts FOR VALUES {bounds}"))
+        return
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE posts INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await conn.execute(text(f"INSERT INTO {name} SELECT * FROM posts_default WHERE {in_range}"))
+    await conn.execute(text(f"DELETE FROM posts_default WHERE {in_range}"))
+    await conn.execute(text(f"ALTER TABLE posts ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logger.info("Moved %d posts from posts_default into new partition %s", stranded, name)
+
+
+async def retire_partitions(conn, cutoff: datetime):
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'posts' AND child.relname LIKE 'posts\\_y%'"
+    ))
+    for name in sorted(result.scalars()):
+        start = datetime(int(name[7:11]), int(name[12:14]), 1)
+        if start >= cutoff:
+            continue
+        await conn.execute(text(f"ALTER TABLE posts DETACH PARTITION {name}"))
+        # Children have no foreign key to cascade from, so they go explicitly in
+        # both modes; a detached month keeps its likes and comments next to it
+        for child in POST_CHILD_TABLES:
+            owned = f"post_id IN (SELECT id FROM {name})"
+            if POSTS_RETIRE_MODE != "drop" and child != "timeline_entries":
+                await conn.execute(text(f"CREATE TABLE {name}_{child} AS SELECT * FROM {child} WHERE {owned}"))
+            await conn.execute(text(f"DELETE FROM {child} WHERE {owned}"))
+        if POSTS_RETIRE_MODE == "drop":
+            await conn.execute(text(f"DROP TABLE {name}"))
+        logger.info("Retired posts partition %s (%s)", name, POSTS_RETIRE_MODE)
+
+
+async def maintenance_loop(engine):
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            async with engine.begin() as conn:
+                # Every worker wakes up; the first to take the lock does the work
+                acquired = (
+                    await conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+                ).scalar()
+                if acquired:
+                    await ensure_partitions(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Partition maintenance failed")
+
+
+def start_maintenance_task(engine) -> asyncio.Task | None:
+    if not PARTITIONING:
+        return None
+    return asyncio.create_task(maintenance_loop(engine))
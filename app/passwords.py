@@ -0,0 +1,98 @@
+import os
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+load_dotenv()
+
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# argon2 and bcrypt release the GIL, so threads are enough; "process" isolates
+# hashing completely at the cost of pickling every call.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or (os.cpu_count() or 1)
+# Auth requests beyond this many in flight are rejected with 429 straight away
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "0")) or PASSWORD_HASH_WORKERS * 4
+AUTH_RETRY_AFTER_SECONDS = int(os.getenv("AUTH_RETRY_AFTER_SECONDS", "1"))
+
+
+def build_password_hash() -> PasswordHash:
+    return PasswordHash((
+        Argon2Hasher(
+            time_cost=ARGON2_TIME_COST,
+            memory_cost=ARGON2_MEMORY_COST,
+            parallelism=ARGON2_PARALLELISM,
+        ),
+        BcryptHasher(rounds=BCRYPT_ROUNDS),
+    ))
+
+
+password_helper = PasswordHelper(build_password_hash())
+
+_executor: Executor | None = None
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+# Module-level so they can be pickled into a process pool
+def _hash(password: str) -> str:
+    return password_helper.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return password_helper.verify_and_update(password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), _hash, password)
+
+
+async def verify_and_update_password(password: str, hashed_password: str):
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(), _verify_and_update, password, hashed_password
+    )
+
+
+class AuthAdmission:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.pending = 0
+
+    async def __call__(self):
+        if self.pending >= self.limit:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, try again shortly",
+                headers={"Retry-After": str(AUTH_RETRY_AFTER_SECONDS)},
+            )
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+
+auth_admission = AuthAdmission(AUTH_MAX_PENDING)
@@ -0,0 +1,100 @@
+import os
+import re
+import hmac
+import time
+import asyncio
+import cProfile
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.profiling")
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_NAME = re.compile(r"^\d+-[A-Za-z0-9_.-]+\.pstats$")
+
+
+def list_profiles():
+    if not PROFILE_DIR.is_dir():
+        return []
+    files = sorted(PROFILE_DIR.glob("*.pstats"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [
+        {"name": p.name, "size": p.stat().st_size, "created_at": p.stat().st_mtime}
+        for p in files
+    ]
+
+
+def profile_path(name: str) -> Path | None:
+    if not PROFILE_NAME.match(name):
+        return None
+    path = PROFILE_DIR / name
+    return path if path.is_file() else None
+
+
+def _profile_name(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{method}{path}").strip("_")[:80] or "root"
+    return f"{time.time_ns()}-{slug}.pstats"
+
+
+def _save(profiler: cProfile.Profile, name: str):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(PROFILE_DIR / name)
+
+    # Keep only the newest PROFILE_KEEP dumps
+    for old in list_profiles()[PROFILE_KEEP:]:
+        (PROFILE_DIR / old["name"]).unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Run cProfile around a single request carrying a valid X-Profile-Token header.
+
+    cProfile sees everything the event loop runs while the request is in flight,
+    so only one request is profiled at a time; concurrent triggers run unprofiled.
+    Output is a pstats file, viewable with snakeviz or convertible with flameprof.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = asyncio.Lock()
+
+    def _triggered(self, scope) -> bool:
+        if not PROFILING_TOKEN:
+            return False
+        for key, value in scope.get("headers") or []:
+            if key == PROFILE_HEADER:
+                return hmac.compare_digest(value, PROFILING_TOKEN.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._triggered(scope) or self.lock.locked():
+            await self.app(scope, receive, send)
+            return
+
+        async with self.lock:
+            profiler = cProfile.Profile()
+            name = _profile_name(scope.get("method", ""), scope.get("path", ""))
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"x-profile-id", name.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+                try:
+                    _save(profiler, name)
+                    logger.info("Saved profile %s for %s %s", name, scope.get("method"), scope.get("path"))
+                except OSError:
+                    logger.exception("Failed to save profile")
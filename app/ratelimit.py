@@ -0,0 +1,225 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, status
+from app.db import User
+from app.users import current_active_user
+from app.metrics import rate_limited_total, admission_rejected_total
+from app.uploads import UPLOAD_BATCH_MAX_FILES
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional, only needed to share limits between workers
+    aioredis = None
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.ratelimit")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Empty keeps limits per worker; redis://... shares them between workers and hosts
+RATE_LIMIT_STORE_URL = os.getenv("RATE_LIMIT_STORE_URL", "")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# The bundled Streamlit frontend calls the API from localhost on behalf of every user
+RATE_LIMIT_EXEMPT_IPS = {
+    ip.strip() for ip in os.getenv("RATE_LIMIT_EXEMPT_IPS", "127.0.0.1,::1").split(",") if ip.strip()
+}
+
+# budget -> (requests per second, burst); override with RATE_LIMITS="like=5/20,comment=1/10"
+DEFAULT_BUDGETS = {
+    "read": (20.0, 60),
+    "post_read": (50.0, 150),
+    "like": (5.0, 20),
+    "comment": (1.0, 10),
+    "write": (2.0, 10),
+    "upload": (0.2, 5),
+    # Charged per file, so the burst has to fit the largest batch
+    "upload_batch": (0.2, max(UPLOAD_BATCH_MAX_FILES, 5)),
+    "follow": (1.0, 20),
+    "auth": (1.0, 10),
+}
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+# Long-lived or operational endpoints that must never be shed or hold a slot
+ADMISSION_EXEMPT_PATHS = tuple(
+    p.strip() for p in os.getenv("ADMISSION_EXEMPT_PATHS", "/metrics,/events").split(",") if p.strip()
+)
+
+
+def parse_budgets(raw: str) -> dict:
+    budgets = dict(DEFAULT_BUDGETS)
+    for part in raw.split(","):
+        name, _, spec = part.partition("=")
+        if not spec:
+            continue
+        rate, _, burst = spec.partition("/")
+        budgets[name.strip()] = (float(rate), int(burst or 1))
+    return budgets
+
+
+BUDGETS = parse_budgets(os.getenv("RATE_LIMITS", ""))
+
+
+class MemoryStore:
+    """GCRA state (theoretical arrival time per key) in an LRU-bounded table."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.tats: OrderedDict[str, float] = OrderedDict()
+
+    async def hit(self, key: str, interval: float, burst: int, now: float, cost: int = 1, charge: bool = True) -> float:
+        """Record a request worth cost tokens; return 0 if allowed, else seconds until it would be."""
+        tat = max(self.tats.get(key, now), now)
+        new_tat = tat + interval * cost
+        wait = new_tat - now - interval * burst
+        if wait > 0 or not charge:
+            return max(wait, 0.0)
+        self.tats[key] = new_tat
+        self.tats.move_to_end(key)
+        # Evicting a key only forgets its history, which is the same as an idle key
+        while len(self.tats) > self.max_keys:
+            self.tats.popitem(last=False)
+        return 0.0
+
+
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local charge = ARGV[5] == '1'
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+local wait = new_tat - now - interval * burst
+if wait > 0 then return tostring(wait) end
+if not charge then return '0' end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1)
+return '0'
+"""
+
+
+class RedisStore:
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("redis is required for RATE_LIMIT_STORE_URL=redis://...")
+        self.client = aioredis.from_url(url)
+        self.script = self.client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, interval: float, burst: int, now: float, cost: int = 1, charge: bool = True) -> float:
+        return float(await self.script(
+            keys=[f"feedapp:rl:{key}"], args=[now, interval, burst, cost, "1" if charge else "0"]
+        ))
+
+
+def create_store(url: str = RATE_LIMIT_STORE_URL):
+    if url.startswith(("redis://", "rediss://")):
+        return RedisStore(url)
+    return MemoryStore()
+
+
+store = create_store()
+
+
+async def check_rate(budget: str, subject: str, cost: int = 1, charge: bool = True):
+    """Spend cost tokens from the budget, or with charge=False only check they are available."""
+    if not RATE_LIMIT_ENABLED or cost <= 0:
+        return
+    rate, burst = BUDGETS[budget]
+    if cost > burst:
+        # Would be refused forever, so a 429 with a Retry-After would be a lie
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {burst} items per request",
+        )
+    try:
+        wait = await store.hit(f"{budget}:{subject}", 1.0 / rate, burst, time.time(), cost, charge)
+    except Exception:
+        # A broken shared store must not take the API down with it
+        logger.exception("Rate limit store failed, allowing request")
+        return
+    if wait > 0:
+        rate_limited_total.inc((budget,))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, slow down",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimit:
+    """Route dependency limiting anonymous traffic by client IP."""
+
+    def __init__(self, budget: str):
+        if budget not in BUDGETS:
+            raise ValueError(f"Unknown rate limit budget {budget}")
+        self.budget = budget
+
+    async def __call__(self, request: Request):
+        ip = client_ip(request)
+        if ip not in RATE_LIMIT_EXEMPT_IPS:
+            await check_rate(self.budget, f"ip:{ip}")
+
+
+class UserRateLimit(RateLimit):
+    """Route dependency limiting by user id; shares the endpoint's current_active_user lookup."""
+
+    async def __call__(self, user: User = Depends(current_active_user)):
+        await check_rate(self.budget, f"user:{user.id}")
+
+
+class AdmissionMiddleware:
+    """Caps requests in flight; excess requests wait briefly in a bounded queue, then get 503."""
+
+    def __init__(self, app, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.app = app
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+
+    async def reject(self, send, reason: str):
+        admission_rejected_total.inc((reason,))
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")],
+        })
+        await send({"type": "http.response.body", "body": b'{"detail":"Server is overloaded, try again shortly"}'})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ADMISSION_EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        if self.slots.locked():
+            # Queueing past this point only turns overload into timeouts for everyone
+            if self.waiting >= self.max_queue:
+                await self.reject(send, "queue_full")
+                return
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self.reject(send, "queue_timeout")
+                return
+            finally:
+                self.waiting -= 1
+        else:
+            await self.slots.acquire()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.slots.release()
@@ -0,0 +1,199 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from app.db import User, Post, Like, Comment, Follow, TimelineEntry, async_session_maker, leader_lock
+from app.uploads import delete_stored_files, list_stored_files, UPLOAD_SESSION_TTL_SECONDS
+from app.metrics import track_storage
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.reaper")
+
+REAPER_ENABLED = os.getenv("REAPER_ENABLED", "true").lower() == "true"
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "100"))
+REAPER_MAX_ATTEMPTS = int(os.getenv("REAPER_MAX_ATTEMPTS", "4"))
+# A claimed tombstone whose object couldn't be deleted is retried after this long
+REAPER_CLAIM_TTL_SECONDS = float(os.getenv("REAPER_CLAIM_TTL_SECONDS", "600"))
+# After this many failed claims a tombstone is parked and left for manual inspection
+REAPER_MAX_CLAIMS = int(os.getenv("REAPER_MAX_CLAIMS", "10"))
+
+# The reconciler deletes storage objects the database doesn't know about. It is
+# off by default and only logs unless dry-run is turned off: pointed at a fresh
+# or half-restored database it would otherwise wipe real media.
+RECONCILE_ENABLED = os.getenv("RECONCILE_ENABLED", "false").lower() == "true"
+RECONCILE_DRY_RUN = os.getenv("RECONCILE_DRY_RUN", "true").lower() == "true"
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "3600"))
+# Objects younger than this may belong to an upload that hasn't been finalized yet
+RECONCILE_MIN_AGE_SECONDS = float(os.getenv("RECONCILE_MIN_AGE_SECONDS", "0")) or max(UPLOAD_SESSION_TTL_SECONDS * 2, 3600)
+
+
+async def delete_with_retries(file_ids: list) -> set:
+    remaining = set(file_ids)
+    deleted = set()
+    for attempt in range(REAPER_MAX_ATTEMPTS):
+        if not remaining:
+            break
+        if attempt:
+            await asyncio.sleep(min(2 ** attempt, 30))
+        with track_storage("bulk_delete"):
+            done = await run_in_threadpool(delete_stored_files, sorted(remaining))
+        deleted |= done
+        remaining -= done
+    if remaining:
+        logger.warning("Could not delete %d storage objects, will retry next run", len(remaining))
+    return deleted
+
+
+async def hard_delete_posts(session: AsyncSession, post_ids: list):
+    await session.execute(delete(TimelineEntry).where(TimelineEntry.post_id.in_(post_ids)))
+    await session.execute(delete(Like).where(Like.post_id.in_(post_ids)))
+    await session.execute(delete(Comment).where(Comment.post_id.in_(post_ids)))
+    await session.execute(delete(Post).where(Post.id.in_(post_ids)))
+
+
+async def claim_tombstones(session: AsyncSession) -> list:
+    """Stamp a batch of tombstones with a claim token in a short transaction and return them."""
+    now = datetime.now(timezone.utc)
+    token = uuid.uuid4().hex
+    claimable = (
+        Post.deleted_at.is_not(None),
+        Post.reap_attempts < REAPER_MAX_CLAIMS,
+        or_(Post.reap_claimed_at.is_(None), Post.reap_claimed_at < now - timedelta(seconds=REAPER_CLAIM_TTL_SECONDS)),
+    )
+    candidates = (
+        select(Post.id)
+        .where(*claimable)
+        .order_by(Post.reap_attempts, Post.deleted_at)
+        .limit(REAPER_BATCH_SIZE)
+        .scalar_subquery()
+    )
+    # The claim conditions are re-checked by the UPDATE itself, so two workers
+    # (SQLite has no SKIP LOCKED) can never both win the same row
+    await session.execute(
+        update(Post)
+        .where(Post.id.in_(candidates), *claimable)
+        .values(reap_claim=token, reap_claimed_at=now, reap_attempts=Post.reap_attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    rows = (
+        await session.execute(
+            select(Post.id, Post.imagekit_file_id, Post.reap_attempts).where(Post.reap_claim == token)
+        )
+    ).all()
+    await session.commit()
+    return rows
+
+
+async def reap_once(session: AsyncSession) -> int:
+    reaped = 0
+    while True:
+        rows = await claim_tombstones(session)
+        if not rows:
+            break
+
+        # No transaction is open while talking to storage
+        deleted = await delete_with_retries([row.imagekit_file_id for row in rows])
+        post_ids = [row.id for row in rows if row.imagekit_file_id in deleted]
+        if post_ids:
+            await hard_delete_posts(session, post_ids)
+            await session.commit()
+        reaped += len(post_ids)
+
+        # Failed rows keep their claim until it expires, so they don't block the rest of the queue
+        parked = [row.id for row in rows if row.imagekit_file_id not in deleted and row.reap_attempts >= REAPER_MAX_CLAIMS]
+        if parked:
+            logger.error("Parking %d tombstones after %d failed deletes: %s", len(parked), REAPER_MAX_CLAIMS, parked)
+
+    purged = await purge_deleted_users(session)
+    if purged:
+        logger.info("Purged %d deleted accounts", purged)
+    return reaped
+
+
+async def purge_deleted_users(session: AsyncSession) -> int:
+    """Delete accounts marked deleted whose posts (and storage objects) are all gone."""
+    user_ids = (
+        await session.execute(select(User.id).where(User.deleted_at.is_not(None)).limit(REAPER_BATCH_SIZE))
+    ).scalars().all()
+    if not user_ids:
+        return 0
+    # Two steps because user.id and posts.user_id are stored differently on SQLite
+    waiting = set(
+        (await session.execute(select(Post.user_id).where(Post.user_id.in_(user_ids)).distinct())).scalars()
+    )
+    done = [user_id for user_id in user_ids if user_id not in waiting]
+    if not done:
+        return 0
+    await session.execute(delete(Follow).where(Follow.follower_id.in_(done) | Follow.followee_id.in_(done)))
+    await session.execute(delete(TimelineEntry).where(TimelineEntry.user_id.in_(done)))
+    await session.execute(delete(Like).where(Like.user_id.in_(done)))
+    await session.execute(delete(Comment).where(Comment.user_id.in_(done)))
+    await session.execute(delete(User).where(User.id.in_(done)))
+    await session.commit()
+    return len(done)
+
+
+async def reconcile_once(session: AsyncSession) -> int:
+    cutoff = time.time() - RECONCILE_MIN_AGE_SECONDS
+    candidates = await run_in_threadpool(
+        lambda: [file_id for file_id, created in list_stored_files() if created < cutoff]
+    )
+
+    orphans = []
+    for first in range(0, len(candidates), 500):
+        page = candidates[first:first + 500]
+        # Tombstoned posts still own their objects; the reaper deletes those
+        known = set(
+            (await session.execute(select(Post.imagekit_file_id).where(Post.imagekit_file_id.in_(page)))).scalars()
+        )
+        orphans.extend(file_id for file_id in page if file_id not in known)
+
+    if not orphans:
+        return 0
+    if RECONCILE_DRY_RUN:
+        logger.warning(
+            "Reconciler dry run: %d orphaned storage objects would be deleted, e.g. %s",
+            len(orphans), orphans[:20],
+        )
+        return 0
+    logger.info("Deleting %d orphaned storage objects", len(orphans))
+    return len(await delete_with_retries(orphans))
+
+
+async def _loop(name: str, interval: float, job, initial_delay: float = 0.0):
+    await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            # Every worker runs this loop; only the one holding the lock does the work
+            async with leader_lock(name) as leader:
+                count = 0
+                if leader:
+                    async with async_session_maker() as session:
+                        count = await job(session)
+            if count:
+                logger.info("%s processed %d items", name, count)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("%s failed", name)
+        await asyncio.sleep(interval)
+
+
+def start_reaper_tasks() -> list:
+    tasks = []
+    if REAPER_ENABLED:
+        tasks.append(asyncio.create_task(_loop("reaper", REAPER_INTERVAL_SECONDS, reap_once)))
+    if RECONCILE_ENABLED:
+        # Never on startup: a worker booted against the wrong database gets a full interval to be noticed
+        tasks.append(asyncio.create_task(
+            _loop("reconciler", RECONCILE_INTERVAL_SECONDS, reconcile_once, initial_delay=RECONCILE_INTERVAL_SECONDS)
+        ))
+    return tasks
@@ -0,0 +1,205 @@
+import re
+import json
+import uuid
+import base64
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# SQLite keeps one FTS5 table per source table. The source rowid isn't a
+# usable key (VACUUM may renumber it), so a small key table maps the stable
+# id to the FTS row, letting triggers update the index with indexed lookups.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_posts USING fts5(body, tokenize='unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_comments USING fts5(body, tokenize='unicode61')",
+    "CREATE TABLE IF NOT EXISTS search_posts_keys (id PRIMARY KEY, fts_rowid INTEGER NOT NULL UNIQUE) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS search_comments_keys (id PRIMARY KEY, fts_rowid INTEGER NOT NULL UNIQUE) WITHOUT ROWID",
+    """CREATE TRIGGER IF NOT EXISTS posts_search_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO search_posts(body) VALUES (coalesce(new.caption, ''));
+        INSERT INTO search_posts_keys(id, fts_rowid) VALUES (new.id, last_insert_rowid());
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_search_ad AFTER DELETE ON posts BEGIN
+        DELETE FROM search_posts WHERE rowid = (SELECT fts_rowid FROM search_posts_keys WHERE id = old.id);
+        DELETE FROM search_posts_keys WHERE id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_search_au AFTER UPDATE OF caption ON posts BEGIN
+        UPDATE search_posts SET body = coalesce(new.caption, '')
+        WHERE rowid = (SELECT fts_rowid FROM search_posts_keys WHERE id = old.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_ai AFTER INSERT ON comments BEGIN
+        INSERT INTO search_comments(body) VALUES (new.content);
+        INSERT INTO search_comments_keys(id, fts_rowid) VALUES (new.id, last_insert_rowid());
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_ad AFTER DELETE ON comments BEGIN
+        DELETE FROM search_comments WHERE rowid = (SELECT fts_rowid FROM search_comments_keys WHERE id = old.id);
+        DELETE FROM search_comments_keys WHERE id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_au AFTER UPDATE OF content ON comments BEGIN
+        UPDATE search_comments SET body = new.content
+        WHERE rowid = (SELECT fts_rowid FROM search_comments_keys WHERE id = old.id);
+    END""",
+]
+
+# The current source rowid is only borrowed as the initial FTS rowid; the key tables pin it
+SQLITE_BACKFILL = [
+    "INSERT INTO search_posts(rowid, body) SELECT rowid, coalesce(caption, '') FROM posts",
+    "INSERT INTO search_posts_keys(id, fts_rowid) SELECT id, rowid FROM posts",
+    "INSERT INTO search_comments(rowid, body) SELECT rowid, content FROM comments",
+    "INSERT INTO search_comments_keys(id, fts_rowid) SELECT id, rowid FROM comments",
+]
+
+# Postgres uses expression GIN indexes, which the planner keeps in sync on its own
+POSTGRES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_posts_caption_fts ON posts "
+    "USING gin (to_tsvector('english', coalesce(caption, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_comments_content_fts ON comments "
+    "USING gin (to_tsvector('english', content))",
+]
+
+SQLITE_POSTS = """
+    SELECT 'post' AS kind, p.id AS id, p.id AS post_id, p.username AS username,
+           p.caption AS body, p.created_at AS created_at, bm25(search_posts) AS score
+    FROM search_posts
+    JOIN search_posts_keys k ON k.fts_rowid = search_posts.rowid
+    JOIN posts p ON p.id = k.id
+    WHERE search_posts MATCH :query AND p.deleted_at IS NULL
+"""
+
+SQLITE_COMMENTS = """
+    SELECT 'comment' AS kind, c.id AS id, c.post_id AS post_id, c.username AS username,
+           c.content AS body, c.created_at AS created_at, bm25(search_comments) AS score
+    FROM search_comments
+    JOIN search_comments_keys k ON k.fts_rowid = search_comments.rowid
+    JOIN comments c ON c.id = k.id
+    JOIN posts p ON p.id = c.post_id
+    WHERE search_comments MATCH :query AND p.deleted_at IS NULL
+"""
+
+# Scores are negated so that, like bm25, lower always means more relevant
+POSTGRES_POSTS = """
+    SELECT 'post' AS kind, p.id AS id, p.id AS post_id, p.username AS username,
+           p.caption AS body, p.created_at AS created_at,
+           -ts_rank(to_tsvector('english', coalesce(p.caption, '')), to_tsquery('english', :query)) AS score
+    FROM posts p
+    WHERE to_tsvector('english', coalesce(p.caption, '')) @@ to_tsquery('english', :query)
+      AND p.deleted_at IS NULL
+"""
+
+POSTGRES_COMMENTS = """
+    SELECT 'comment' AS kind, c.id AS id, c.post_id AS post_id, c.username AS username,
+           c.content AS body, c.created_at AS created_at,
+           -ts_rank(to_tsvector('english', c.content), to_tsquery('english', :query)) AS score
+    FROM comments c JOIN posts p ON p.id = c.post_id
+    WHERE to_tsvector('english', c.content) @@ to_tsquery('english', :query)
+      AND p.deleted_at IS NULL
+"""
+
+SEARCH_KINDS = ("all", "posts", "comments")
+
+
+def setup_search(conn):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        existing = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'search_posts'"
+        ).first()
+        for statement in SQLITE_DDL:
+            conn.exec_driver_sql(statement)
+        if existing is None:
+            for statement in SQLITE_BACKFILL:
+                conn.exec_driver_sql(statement)
+    elif dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            conn.exec_driver_sql(statement)
+
+
+def build_query(dialect: str, q: str):
+    terms = re.findall(r"\w+", q.lower())
+    if not terms:
+        return None
+    # The last term is treated as a prefix so results show up while typing
+    if dialect == "postgresql":
+        parts = [f"{t}" for t in terms[:-1]] + [f"{terms[-1]}:*"]
+        return " & ".join(parts)
+    parts = [f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*']
+    return " ".join(parts)
+
+
+def encode_cursor(score: float, kind: str, id: str) -> str:
+    raw = json.dumps([score, kind, id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    score, kind, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return float(score), str(kind), str(id)
+
+
+def _to_uuid(value):
+    if isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+def _to_iso(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value).replace(" ", "T")
+
+
+async def search(session: AsyncSession, q: str, kind: str = "all", limit: int = 20, cursor: str | None = None):
+    dialect = session.bind.dialect.name
+    query = build_query(dialect, q)
+    if query is None:
+        return {"results": [], "next_cursor": None}
+
+    if dialect == "postgresql":
+        posts_sql, comments_sql = POSTGRES_POSTS, POSTGRES_COMMENTS
+    else:
+        posts_sql, comments_sql = SQLITE_POSTS, SQLITE_COMMENTS
+
+    parts = []
+    if kind in ("all", "posts"):
+        parts.append(posts_sql)
+    if kind in ("all", "comments"):
+        parts.append(comments_sql)
+
+    params = {"query": query, "limit": limit + 1}
+    where = ""
+    if cursor:
+        score, cursor_kind, cursor_id = decode_cursor(cursor)
+        where = (
+            "WHERE score > :score OR (score = :score AND "
+            "(kind > :cursor_kind OR (kind = :cursor_kind AND CAST(id AS TEXT) > :cursor_id)))"
+        )
+        params.update(score=score, cursor_kind=cursor_kind, cursor_id=cursor_id)
+
+    sql = (
+        f"SELECT * FROM ({' UNION ALL '.join(parts)}) AS matches {where} "
+        "ORDER BY score, kind, CAST(id AS TEXT) LIMIT :limit"
+    )
+    rows = (await session.execute(text(sql), params)).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(float(last["score"]), last["kind"], str(last["id"]))
+
+    return {
+        "results": [
+            {
+                "type": row["kind"],
+                "id": str(_to_uuid(row["id"])),
+                "post_id": str(_to_uuid(row["post_id"])),
+                "username": row["username"],
+                "content": row["body"],
+                "created_at": _to_iso(row["created_at"]),
+                "score": -float(row["score"]),
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
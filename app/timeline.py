@@ -0,0 +1,195 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import select, delete, func, literal, and_, or_, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from app.db import Post, Follow, TimelineEntry, User, async_session_maker, insert_ignoring_conflicts
+from app.partitions import PARTITIONING
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.timeline")
+
+# Accounts with more followers than this are not fanned out on write;
+# their posts are merged into readers' timelines at read time instead.
+FANOUT_MAX_FOLLOWERS = int(os.getenv("FANOUT_MAX_FOLLOWERS", "5000"))
+FOLLOW_BACKFILL_POSTS = int(os.getenv("FOLLOW_BACKFILL_POSTS", "50"))
+
+fanout_queue: asyncio.Queue = asyncio.Queue()
+
+
+async def fan_out_post(session: AsyncSession, post_id, author_id, created_at):
+    author = await session.get(User, author_id)
+    if author is None:
+        return
+
+    # The author always sees their own post
+    values = [{"user_id": author_id, "post_id": post_id, "author_id": author_id, "created_at": created_at}]
+    # Retries and a concurrent follow backfill may already have written some of these rows
+    await session.execute(insert_ignoring_conflicts(session, TimelineEntry.__table__), values)
+
+    if author.followers_count <= FANOUT_MAX_FOLLOWERS:
+        await session.execute(
+            insert_ignoring_conflicts(session, TimelineEntry.__table__).from_select(
+                ["user_id", "post_id", "author_id", "created_at"],
+                select(
+                    Follow.follower_id,
+                    literal(post_id, type_=Post.id.type),
+                    literal(author_id, type_=Post.user_id.type),
+                    literal(created_at, type_=Post.created_at.type),
+                ).where(Follow.followee_id == author_id),
+            )
+        )
+    await session.commit()
+
+
+def enqueue_fanout(post: Post):
+    fanout_queue.put_nowait((post.id, post.user_id, post.created_at))
+
+
+async def fanout_worker():
+    while True:
+        post_id, author_id, created_at = await fanout_queue.get()
+        try:
+            async with async_session_maker() as session:
+                await fan_out_post(session, post_id, author_id, created_at)
+        except Exception:
+            logger.exception("Fan-out failed for post %s", post_id)
+        finally:
+            fanout_queue.task_done()
+
+
+def start_fanout_worker() -> asyncio.Task:
+    return asyncio.create_task(fanout_worker())
+
+
+async def stop_fanout_worker(task: asyncio.Task, timeout: float = 10.0):
+    try:
+        await asyncio.wait_for(fanout_queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Fan-out queue not drained on shutdown (%d pending)", fanout_queue.qsize())
+    task.cancel()
+
+
+async def backfill_follow(session: AsyncSession, follower_id, followee: User):
+    if followee.followers_count > FANOUT_MAX_FOLLOWERS:
+        return
+    recent = (
+        select(Post.id, Post.user_id, Post.created_at)
+        .where(Post.user_id == followee.id, Post.deleted_at.is_(None))
+        .order_by(Post.created_at.desc())
+        .limit(FOLLOW_BACKFILL_POSTS)
+        .subquery()
+    )
+    await session.execute(
+        insert_ignoring_conflicts(session, TimelineEntry.__table__).from_select(
+            ["user_id", "post_id", "author_id", "created_at"],
+            # SQLite needs a WHERE here to parse INSERT ... SELECT ... ON CONFLICT
+            select(literal(follower_id, type_=Post.user_id.type), recent.c.id, recent.c.user_id, recent.c.created_at)
+            .where(true()),
+        )
+    )
+
+
+async def rebuild_timelines(session: AsyncSession) -> int:
+    """Materialize every home timeline from posts and follows, e.g. after a bulk import.
+
+    Like a new follow, each followed account contributes at most its
+    FOLLOW_BACKFILL_POSTS latest posts, so the work is bounded by follows
+    rather than follows times posts.
+    """
+    # Two steps for the same reason as in read_timeline: user.id can't be joined on SQLite
+    celebrities = (
+        await session.execute(select(User.id).where(User.followers_count > FANOUT_MAX_FOLLOWERS))
+    ).scalars().all()
+    columns = ["user_id", "post_id", "author_id", "created_at"]
+    own = await session.execute(
+        insert_ignoring_conflicts(session, TimelineEntry.__table__).from_select(
+            columns,
+            select(Post.user_id, Post.id, Post.user_id, Post.created_at).where(Post.deleted_at.is_(None)),
+        )
+    )
+    recent = (
+        select(
+            Post.id,
+            Post.user_id,
+            Post.created_at,
+            func.row_number().over(partition_by=Post.user_id, order_by=Post.created_at.desc()).label("rank"),
+        )
+        .where(Post.deleted_at.is_(None), Post.user_id.not_in(celebrities))
+        .subquery()
+    )
+    followed = await session.execute(
+        insert_ignoring_conflicts(session, TimelineEntry.__table__).from_select(
+            columns,
+            select(Follow.follower_id, recent.c.id, recent.c.user_id, recent.c.created_at)
+            .join(recent, recent.c.user_id == Follow.followee_id)
+            .where(recent.c.rank <= FOLLOW_BACKFILL_POSTS),
+        )
+    )
+    return max(own.rowcount, 0) + max(followed.rowcount, 0)
+
+
+async def remove_followee_entries(session: AsyncSession, follower_id, followee_id):
+    await session.execute(
+        delete(TimelineEntry).where(
+            (TimelineEntry.user_id == follower_id) & (TimelineEntry.author_id == followee_id)
+        )
+    )
+
+
+async def read_timeline(session: AsyncSession, user_id, limit: int, before: datetime | None = None, before_id=None):
+    def page(created_at_col, id_col):
+        if before is None:
+            return true()
+        return or_(created_at_col < before, and_(created_at_col == before, id_col < before_id))
+
+    # Entries copy the post's created_at, which lets each lookup prune to one posts partition
+    timeline_join = TimelineEntry.post_id == Post.id
+    if PARTITIONING:
+        timeline_join = and_(timeline_join, TimelineEntry.created_at == Post.created_at)
+
+    # Fan-out-on-write part: a single range read on the (user_id, created_at) primary key
+    result = await session.execute(
+        select(Post)
+        .join(TimelineEntry, timeline_join)
+        .where(TimelineEntry.user_id == user_id, Post.deleted_at.is_(None))
+        .where(page(TimelineEntry.created_at, TimelineEntry.post_id))
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc())
+        .limit(limit)
+    )
+    posts = list(result.scalars().all())
+
+    # Fan-out-on-read part for followed accounts that are too big to fan out.
+    # Resolved in two steps because user.id and the follows columns are stored
+    # differently on SQLite, so they can't be joined in SQL.
+    followee_ids = (
+        await session.execute(select(Follow.followee_id).where(Follow.follower_id == user_id))
+    ).scalars().all()
+    if not followee_ids:
+        return posts
+    celebrities = (
+        await session.execute(
+            select(User.id).where(User.id.in_(followee_ids) & (User.followers_count > FANOUT_MAX_FOLLOWERS))
+        )
+    ).scalars().all()
+    if not celebrities:
+        return posts
+    result = await session.execute(
+        select(Post)
+        .where(Post.user_id.in_(celebrities), Post.deleted_at.is_(None))
+        .where(page(Post.created_at, Post.id))
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit)
+    )
+    extra = result.scalars().all()
+
+    if extra:
+        seen = {p.id for p in posts}
+        posts.extend(p for p in extra if p.id not in seen)
+        posts.sort(key=lambda p: (p.created_at, p.id), reverse=True)
+        posts = posts[:limit]
+
+    return posts
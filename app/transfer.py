@@ -0,0 +1,241 @@
+"""Stream tables out as NDJSON and load them back in batches.
+
+    python -m app.transfer export --output backup.ndjson
+    python -m app.transfer import backup.ndjson --checkpoint backup.ckpt --rebuild-timelines
+    python -m app.transfer rebuild-timelines
+
+Every line is {"table": ..., "row": {...}}. Imports commit in chunks and
+skip rows that already exist, so an interrupted import can simply be rerun
+(with --checkpoint it also skips the lines it already committed). Home
+timelines are derived data and aren't exported; they are rebuilt from posts
+and follows only when asked, with --rebuild-timelines after the last import
+or the rebuild-timelines command.
+"""
+import os
+import sys
+import json
+import uuid
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import select, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import (
+    User, Follow, Post, Comment, Like, async_session_maker, engine, create_db_and_tables, insert_ignoring_conflicts,
+)
+from app.timeline import rebuild_timelines
+from fastapi_users_db_sqlalchemy.generics import GUID
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# Dependency order, so an import never inserts a row before the row it references
+TABLES = {
+    "users": User.__table__,
+    "follows": Follow.__table__,
+    "posts": Post.__table__,
+    "comments": Comment.__table__,
+    "likes": Like.__table__,
+}
+DEFAULT_TABLES = ("posts", "comments", "likes")
+
+
+def parse_tables(raw: str | None) -> list:
+    if not raw:
+        return list(DEFAULT_TABLES)
+    names = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = names - TABLES.keys()
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    return [name for name in TABLES if name in names]
+
+
+def _encode(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, (UUID, GUID)):
+        return uuid.UUID(value)
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
+
+
+async def export_ndjson(session: AsyncSession, tables: list):
+    """Yield NDJSON chunks, one per batch of rows, reading through a server-side cursor."""
+    for name in tables:
+        table = TABLES[name]
+        result = await session.stream(select(table).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            lines = [
+                json.dumps({"table": name, "row": {key: _encode(value) for key, value in row._mapping.items()}})
+                for row in rows
+            ]
+            yield ("\n".join(lines) + "\n").encode()
+
+
+async def iter_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+class TransferError(Exception):
+    """Raised with the number of lines that were committed before the failure."""
+
+    def __init__(self, message: str, committed_lines: int):
+        super().__init__(message)
+        self.committed_lines = committed_lines
+
+
+async def import_ndjson(session: AsyncSession, lines, skip: int = 0, progress=None, rebuild: bool = False) -> dict:
+    """Insert NDJSON rows in multi-row batches, committing every IMPORT_BATCH_SIZE lines.
+
+    progress(committed_lines, counts) is called after every commit. With
+    rebuild, home timelines are rebuilt once all lines are in.
+    """
+    counts: dict[str, int] = {}
+    batches: dict[str, list] = {}
+    line_number = 0
+    pending = 0
+    committed = skip
+
+    async def flush():
+        nonlocal pending, committed
+        # Flushed in dependency order so foreign keys are satisfied within the chunk
+        for name in TABLES:
+            rows = batches.pop(name, None)
+            if rows:
+                result = await session.execute(insert_ignoring_conflicts(session, TABLES[name]).values(rows))
+                # Rows that already existed are skipped and not counted
+                counts[name] = counts.get(name, 0) + max(result.rowcount, 0)
+        await session.commit()
+        committed = line_number
+        pending = 0
+        if progress:
+            progress(committed, counts)
+
+    try:
+        async for raw in lines:
+            line_number += 1
+            if line_number <= skip or not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+                table = TABLES[record["table"]]
+                row = {column.name: _decode(column, record["row"].get(column.name)) for column in table.columns}
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"line {line_number}: invalid record ({e})")
+            batches.setdefault(record["table"], []).append(row)
+            pending += 1
+            if pending >= IMPORT_BATCH_SIZE:
+                await flush()
+        if pending:
+            await flush()
+        summary = {"lines": line_number, "inserted": counts}
+        if rebuild:
+            # Also run when nothing new was inserted, so rerunning an import whose
+            # rebuild was interrupted still completes it
+            summary["timeline_entries"] = await rebuild_timelines(session)
+            await session.commit()
+    except Exception as e:
+        await session.rollback()
+        raise TransferError(str(getattr(e, "orig", e)), committed) from e
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import FeedApp data as NDJSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export")
+    export.add_argument("--tables", help=f"comma separated, default {','.join(DEFAULT_TABLES)}")
+    export.add_argument("--output", help="file to write, default stdout")
+
+    load = commands.add_parser("import")
+    load.add_argument("input", help="NDJSON file, or - for stdin")
+    load.add_argument("--checkpoint", help="file recording committed lines, used to resume")
+    load.add_argument("--rebuild-timelines", action="store_true", help="rebuild home timelines after the import")
+
+    commands.add_parser("rebuild-timelines")
+    return parser.parse_args(argv)
+
+
+async def _file_lines(handle):
+    for line in handle:
+        yield line
+
+
+async def run(args):
+    try:
+        if args.command == "export":
+            out = open(args.output, "wb") if args.output else sys.stdout.buffer
+            try:
+                async with async_session_maker() as session:
+                    async for chunk in export_ndjson(session, parse_tables(args.tables)):
+                        out.write(chunk)
+            finally:
+                if args.output:
+                    out.close()
+            return
+
+        await create_db_and_tables()
+        if args.command == "rebuild-timelines":
+            async with async_session_maker() as session:
+                entries = await rebuild_timelines(session)
+                await session.commit()
+            print(json.dumps({"timeline_entries": entries}))
+            return
+
+        checkpoint = Path(args.checkpoint) if args.checkpoint else None
+        skip = int(checkpoint.read_text()) if checkpoint and checkpoint.exists() else 0
+        started = time.perf_counter()
+
+        def progress(committed, counts):
+            if checkpoint:
+                checkpoint.write_text(str(committed))
+            rate = sum(counts.values()) / max(time.perf_counter() - started, 1e-9)
+            print(f"\r{committed} lines committed, {rate:.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+        handle = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+        try:
+            async with async_session_maker() as session:
+                summary = await import_ndjson(
+                    session, _file_lines(handle), skip=skip, progress=progress, rebuild=args.rebuild_timelines
+                )
+        except TransferError as e:
+            print(f"\nimport failed after {e.committed_lines} committed lines: {e}", file=sys.stderr)
+            raise SystemExit(1)
+        finally:
+            if handle is not sys.stdin.buffer:
+                handle.close()
+        print(file=sys.stderr)
+        print(json.dumps(summary))
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
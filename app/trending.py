@@ -0,0 +1,136 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from app.db import Post, post_id_clause, async_session_maker, leader_lock
+from app.partitions import PARTITIONING
+
+load_dotenv()
+
+logger = logging.getLogger("feedapp.trending")
+
+LIKE_WEIGHT = float(os.getenv("HOT_LIKE_WEIGHT", "1"))
+COMMENT_WEIGHT = float(os.getenv("HOT_COMMENT_WEIGHT", "2"))
+HOT_GRAVITY = float(os.getenv("HOT_GRAVITY", "1.8"))
+# Posts older than this drop out of the hot feed (their score is zeroed)
+HOT_WINDOW_HOURS = float(os.getenv("HOT_WINDOW_HOURS", "72"))
+HOT_REDECAY_SECONDS = float(os.getenv("HOT_REDECAY_SECONDS", "300"))
+REDECAY_BATCH_SIZE = 1000
+
+
+def _utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes even though we store UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def hot_score(likes: int, comments: int, created_at: datetime, now: datetime | None = None) -> float:
+    now = now or datetime.now(timezone.utc)
+    age_hours = max((now - _utc(created_at)).total_seconds() / 3600, 0.0)
+    if age_hours > HOT_WINDOW_HOURS:
+        return 0.0
+    engagement = LIKE_WEIGHT * likes + COMMENT_WEIGHT * comments
+    return engagement / (age_hours + 2) ** HOT_GRAVITY
+
+
+async def record_engagement(session: AsyncSession, post_id, likes: int = 0, comments: int = 0):
+    # Counter bumps are done in SQL so concurrent events don't overwrite each other;
+    # the caller commits together with the like/comment row.
+    await session.execute(
+        update(Post)
+        .where(post_id_clause(post_id))
+        .values(
+            likes_count=Post.likes_count + likes,
+            comments_count=Post.comments_count + comments,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    row = (
+        await session.execute(
+            select(Post.likes_count, Post.comments_count, Post.created_at).where(post_id_clause(post_id))
+        )
+    ).first()
+    if row is None:
+        return None
+    await session.execute(
+        update(Post)
+        .where(post_id_clause(post_id))
+        .values(hot_score=hot_score(row.likes_count, row.comments_count, row.created_at))
+        .execution_options(synchronize_session=False)
+    )
+    return row.likes_count, row.comments_count
+
+
+async def redecay(session: AsyncSession) -> int:
+    now = datetime.now(timezone.utc)
+    # Anything older has already been zeroed by an earlier pass; the bound keeps
+    # the scan on recent posts (and recent partitions when posts is partitioned)
+    oldest = now - timedelta(hours=HOT_WINDOW_HOURS) - timedelta(seconds=HOT_REDECAY_SECONDS) * 2
+    updated = 0
+    last_id = None
+
+    while True:
+        query = (
+            select(Post.id, Post.likes_count, Post.comments_count, Post.created_at)
+            # Posts without engagement stay at zero until their first like/comment
+            .where(Post.hot_score > 0, Post.created_at >= oldest)
+            .order_by(Post.id)
+            .limit(REDECAY_BATCH_SIZE)
+        )
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        rows = (await session.execute(query)).all()
+        if not rows:
+            break
+
+        await session.execute(
+            update(Post),
+            [
+                {
+                    "id": row.id,
+                    "hot_score": hot_score(row.likes_count, row.comments_count, row.created_at, now),
+                    # Part of the primary key (and the WHERE) only when posts is partitioned
+                    **({"created_at": row.created_at} if PARTITIONING else {}),
+                }
+                for row in rows
+            ],
+        )
+        await session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+
+    return updated
+
+
+async def redecay_loop():
+    while True:
+        try:
+            # One worker re-decays for everyone
+            async with leader_lock("redecay") as leader:
+                if leader:
+                    async with async_session_maker() as session:
+                        updated = await redecay(session)
+                    logger.debug("Re-decayed hot scores for %d posts", updated)
+        except Exception:
+            logger.exception("Hot score re-decay failed")
+        await asyncio.sleep(HOT_REDECAY_SECONDS)
+
+
+def start_redecay_task() -> asyncio.Task:
+    return asyncio.create_task(redecay_loop())
+
+
+async def get_hot_posts(session: AsyncSession, limit: int, offset: int = 0):
+    result = await session.execute(
+        select(Post)
+        .where(Post.hot_score > 0, Post.deleted_at.is_(None))
+        .where(Post.created_at >= datetime.now(timezone.utc) - timedelta(hours=HOT_WINDOW_HOURS))
+        .order_by(Post.hot_score.desc(), Post.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return result.scalars().all()
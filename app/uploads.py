@@ -0,0 +1,330 @@
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+import jwt
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.staticfiles import StaticFiles
+from fastapi_users.jwt import generate_jwt, decode_jwt
+from starlette.concurrency import run_in_threadpool
+from imagekitio import NotFoundError
+from app.images import imagekit
+from app.metrics import track_storage
+
+load_dotenv()
+
+SECRET = os.getenv("SECRET")
+IMAGEKIT_PUBLIC_KEY = os.getenv("IMAGEKIT_PUBLIC_KEY")
+IMAGEKIT_UPLOAD_URL = os.getenv("IMAGEKIT_UPLOAD_URL", "https://upload.imagekit.io/api/v1/files/upload")
+
+# "imagekit" uploads straight to ImageKit; "local" uses the /uploads/local stand-in route
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "imagekit")
+LOCAL_STORAGE_DIR = Path(os.getenv("LOCAL_STORAGE_DIR", "media"))
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://127.0.0.1:8000")
+
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "900"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+# The only types accepted; stored files get the extension listed here, never the client's
+CONTENT_TYPE_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "video/mp4": ".mp4", "video/quicktime": ".mov"}
+ALLOWED_CONTENT_TYPES = set(CONTENT_TYPE_EXTENSIONS)
+EXTENSION_CONTENT_TYPES = {extension: content_type for content_type, extension in CONTENT_TYPE_EXTENSIONS.items()}
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "20"))
+# Storage transfers in flight per batch request
+UPLOAD_BATCH_CONCURRENCY = int(os.getenv("UPLOAD_BATCH_CONCURRENCY", "4"))
+
+UPLOAD_SESSION_AUDIENCE = "feedapp:upload-session"
+LOCAL_FILE_PREFIX = "local:"
+LOCAL_CHUNK_SIZE = 64 * 1024
+
+
+def _safe_file_name(name: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.basename(name or "")).strip("._")
+    return name[:100] or "upload"
+
+
+def _stored_name(name: str, content_type: str) -> str:
+    stem = os.path.splitext(_safe_file_name(name))[0].strip("._") or "upload"
+    return stem[:90] + CONTENT_TYPE_EXTENSIONS[content_type]
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    """The allowed type the first bytes of a file actually are, if any."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    return None
+
+
+def content_matches(declared: str, actual: str | None) -> bool:
+    # MP4 and QuickTime share a container and clients mix the two labels up
+    return actual is not None and (actual == declared or (actual.startswith("video/") and declared.startswith("video/")))
+
+
+class MediaFiles(StaticFiles):
+    """Serves local uploads with the type implied by the allow-list, never one guessed from the name."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        content_type = EXTENSION_CONTENT_TYPES.get(Path(full_path).suffix.lower())
+        response.headers["content-type"] = content_type or "application/octet-stream"
+        response.headers["x-content-type-options"] = "nosniff"
+        if content_type is None:
+            response.headers["content-disposition"] = "attachment"
+        return response
+
+
+def _session_tag(session_id: str) -> str:
+    return f"upload-session-{session_id}"
+
+
+def create_upload_session(user_id, file_name: str, content_type: str, size: int | None = None):
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported content type {content_type}")
+    if size is not None and size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    session_id = uuid.uuid4().hex
+    file_name = _stored_name(file_name, content_type)
+    expire = int(time.time()) + UPLOAD_SESSION_TTL_SECONDS
+    session_token = generate_jwt(
+        {
+            "sub": str(user_id),
+            "sid": session_id,
+            "name": file_name,
+            "ct": content_type,
+            "aud": [UPLOAD_SESSION_AUDIENCE],
+        },
+        SECRET,
+        UPLOAD_SESSION_TTL_SECONDS,
+    )
+
+    if STORAGE_BACKEND == "local":
+        upload = {
+            "method": "PUT",
+            "url": f"{PUBLIC_BASE_URL}/uploads/local/{session_id}",
+            "headers": {"Content-Type": content_type, "X-Upload-Session": session_token},
+        }
+    else:
+        auth = imagekit.helper.get_authentication_parameters(token=session_id, expire=expire)
+        upload = {
+            "method": "POST",
+            "url": IMAGEKIT_UPLOAD_URL,
+            # Sent as multipart form fields together with the "file" part
+            "fields": {
+                "publicKey": IMAGEKIT_PUBLIC_KEY,
+                "token": auth["token"],
+                "expire": str(auth["expire"]),
+                "signature": auth["signature"],
+                "fileName": file_name,
+                "useUniqueFileName": "true",
+                "tags": f"direct-upload,{_session_tag(session_id)}",
+            },
+        }
+
+    return {
+        "session_token": session_token,
+        "expires_at": expire,
+        "max_bytes": UPLOAD_MAX_BYTES,
+        "upload": upload,
+    }
+
+
+def decode_upload_session(session_token: str, user_id=None) -> dict:
+    try:
+        claims = decode_jwt(session_token, SECRET, [UPLOAD_SESSION_AUDIENCE])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload session")
+    if user_id is not None and claims["sub"] != str(user_id):
+        raise HTTPException(status_code=403, detail="Upload session belongs to another user")
+    return claims
+
+
+def _local_path(session_id: str, file_name: str) -> Path:
+    return LOCAL_STORAGE_DIR / f"{session_id}-{file_name}"
+
+
+async def receive_local_upload(session_id: str, session_token: str, request):
+    claims = decode_upload_session(session_token)
+    if claims["sid"] != session_id:
+        raise HTTPException(status_code=400, detail="Upload session mismatch")
+
+    LOCAL_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _local_path(session_id, claims["name"])
+    partial = path.with_suffix(path.suffix + ".part")
+    # A session uploads once; replacing the file could swap the media under a finalized post
+    if path.exists():
+        raise HTTPException(status_code=409, detail="File already uploaded")
+    try:
+        out = open(partial, "xb")
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail="Upload already in progress")
+    size = 0
+    try:
+        # Streamed to disk chunk by chunk so memory doesn't grow with the file
+        with out:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="File too large")
+                out.write(chunk)
+        # Unlike a rename, a link fails instead of overwriting an existing file
+        try:
+            os.link(partial, path)
+        except FileExistsError:
+            raise HTTPException(status_code=409, detail="File already uploaded")
+    finally:
+        partial.unlink(missing_ok=True)
+    return {"size": size}
+
+
+async def resolve_uploaded_file(claims: dict, file_id: str | None):
+    """Check the uploaded object exists and matches its session; return the Post storage fields."""
+    content_type = claims["ct"]
+    file_type = "video" if content_type.startswith("video/") else "image"
+
+    if STORAGE_BACKEND == "local":
+        path = _local_path(claims["sid"], claims["name"])
+        if not path.is_file():
+            raise HTTPException(status_code=400, detail="File has not been uploaded")
+        with open(path, "rb") as stored:
+            actual = sniff_content_type(stored.read(16))
+        if not content_matches(content_type, actual):
+            path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail=f"Uploaded file is not {content_type}")
+        return {
+            "imagekit_file_id": f"{LOCAL_FILE_PREFIX}{path.name}",
+            "url": f"{PUBLIC_BASE_URL}/media/{path.name}",
+            "file_name": claims["name"],
+            "file_type": file_type,
+        }
+
+    if not file_id:
+        raise HTTPException(status_code=400, detail="file_id is required")
+    try:
+        with track_storage("get"):
+            details = await run_in_threadpool(imagekit.files.get, file_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Uploaded file not found")
+
+    if _session_tag(claims["sid"]) not in (details.tags or []):
+        raise HTTPException(status_code=400, detail="File was not uploaded with this session")
+    if details.size is not None and details.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    # ImageKit reports the type it detected, not the one the client declared
+    if not content_matches(content_type, details.mime):
+        raise HTTPException(status_code=400, detail=f"Uploaded file is not {content_type}")
+
+    return {
+        "imagekit_file_id": details.file_id,
+        "url": details.url,
+        "file_name": details.name,
+        "file_type": file_type,
+    }
+
+
+def store_file(file, file_name: str, content_type: str) -> dict:
+    """Upload a file object from the API process (blocking); return the Post storage fields."""
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported content type {content_type}")
+    head = file.read(16)
+    file.seek(0)
+    if not content_matches(content_type, sniff_content_type(head)):
+        raise ValueError(f"File is not {content_type}")
+
+    file_type = "video" if content_type.startswith("video/") else "image"
+    file_name = _stored_name(file_name, content_type)
+    if STORAGE_BACKEND == "local":
+        LOCAL_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _local_path(uuid.uuid4().hex, file_name)
+        with open(path, "wb") as out:
+            while chunk := file.read(LOCAL_CHUNK_SIZE):
+                out.write(chunk)
+        return {
+            "imagekit_file_id": f"{LOCAL_FILE_PREFIX}{path.name}",
+            "url": f"{PUBLIC_BASE_URL}/media/{path.name}",
+            "file_name": file_name,
+            "file_type": file_type,
+        }
+
+    result = imagekit.files.upload(
+        file=file.read(),
+        file_name=file_name,
+        use_unique_file_name=True,
+        tags=["backend-upload"],
+    )
+    if not getattr(result, "file_id", None):
+        raise RuntimeError("ImageKit upload failed")
+    return {
+        "imagekit_file_id": result.file_id,
+        "url": result.url,
+        "file_name": result.name,
+        "file_type": file_type,
+    }
+
+
+def delete_stored_file(file_id: str):
+    if file_id.startswith(LOCAL_FILE_PREFIX):
+        (LOCAL_STORAGE_DIR / file_id[len(LOCAL_FILE_PREFIX):]).unlink(missing_ok=True)
+        return
+    imagekit.files.delete(file_id)
+
+
+def delete_stored_files(file_ids) -> set:
+    """Delete many stored objects; return the ids that are gone (including ones already missing)."""
+    deleted = set()
+    remote = []
+    for file_id in file_ids:
+        if file_id.startswith(LOCAL_FILE_PREFIX):
+            delete_stored_file(file_id)
+            deleted.add(file_id)
+        else:
+            remote.append(file_id)
+
+    # ImageKit's bulk API takes at most 100 ids and fails the whole batch if
+    # any id is unknown, so fall back to single deletes for that batch.
+    for first in range(0, len(remote), 100):
+        batch = remote[first:first + 100]
+        try:
+            result = imagekit.files.bulk.delete(file_ids=batch)
+            deleted.update(result.successfully_deleted_file_ids or [])
+        except Exception:
+            for file_id in batch:
+                try:
+                    imagekit.files.delete(file_id)
+                    deleted.add(file_id)
+                except NotFoundError:
+                    deleted.add(file_id)
+                except Exception:
+                    pass
+    return deleted
+
+
+def list_stored_files(page_size: int = 1000):
+    """Yield (file_id, created_at epoch seconds) for every object this app uploaded."""
+    if STORAGE_BACKEND == "local":
+        if not LOCAL_STORAGE_DIR.is_dir():
+            return
+        for path in LOCAL_STORAGE_DIR.iterdir():
+            if path.is_file() and not path.name.endswith(".part"):
+                yield f"{LOCAL_FILE_PREFIX}{path.name}", path.stat().st_mtime
+        return
+
+    skip = 0
+    while True:
+        page = imagekit.assets.list(
+            type="file",
+            search_query='tags IN ["backend-upload", "direct-upload"]',
+            sort="ASC_CREATED",
+            skip=skip,
+            limit=page_size,
+        )
+        for item in page:
+            yield item.file_id, item.created_at.timestamp() if item.created_at else 0.0
+        if len(page) < page_size:
+            return
+        skip += page_size
@@ -0,0 +1,63 @@
+import time
+import uuid
+import random
+from types import SimpleNamespace
+
+
+class FakeBulk:
+    def __init__(self, files):
+        self.files = files
+
+    def delete(self, file_ids):
+        self.files._sleep()
+        self.files.deletes += len(file_ids)
+        return SimpleNamespace(successfully_deleted_file_ids=list(file_ids))
+
+
+class FakeStorageFiles:
+    """Stand-in for imagekit.files that never leaves the process."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.uploads = 0
+        self.deletes = 0
+        self.bulk = FakeBulk(self)
+
+    def _sleep(self):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def upload(self, file, file_name, use_unique_file_name=True, tags=None, **kwargs):
+        self._sleep()
+        self.uploads += 1
+        file_id = uuid.uuid4().hex
+        return SimpleNamespace(
+            file_id=file_id,
+            name=f"{file_id}-{file_name}",
+            url=f"https://fake-storage.local/{file_id}/{file_name}",
+        )
+
+    def delete(self, file_id):
+        self._sleep()
+        self.deletes += 1
+        return None
+
+
+class FakeStorageAssets:
+    """Stand-in for imagekit.assets; lists nothing, so a reconciler pass has nothing to delete."""
+
+    def list(self, **kwargs):
+        return []
+
+
+def install(latency_ms: float = 0.0, jitter_ms: float = 0.0) -> FakeStorageFiles:
+    # Every ImageKit entry point the app uses, including the reaper's, so a
+    # bench run can never reach the real account
+    from app.images import imagekit
+
+    files = FakeStorageFiles(latency_ms, jitter_ms)
+    imagekit.files = files
+    imagekit.assets = FakeStorageAssets()
+    return files
@@ -0,0 +1,73 @@
+"""Measure password hashing cost and event-loop stalls for the configured parameters.
+
+    ARGON2_TIME_COST=2 ARGON2_MEMORY_COST=32768 python -m bench.hashing --logins 64
+
+Tune ARGON2_* / BCRYPT_ROUNDS so a single hash stays in the 50-250ms range.
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark password hashing")
+    parser.add_argument("--samples", type=int, default=10, help="sequential hashes to time")
+    parser.add_argument("--logins", type=int, default=32, help="concurrent verifications to run through the pool")
+    return parser.parse_args(argv)
+
+
+async def probe_loop(stop: asyncio.Event, lags: list):
+    # How late a 10ms sleep wakes up approximates how long the loop was blocked
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+
+async def run(args):
+    from app import passwords
+
+    print(
+        f"argon2 t={passwords.ARGON2_TIME_COST} m={passwords.ARGON2_MEMORY_COST} "
+        f"p={passwords.ARGON2_PARALLELISM}, executor={passwords.PASSWORD_HASH_EXECUTOR} "
+        f"x{passwords.PASSWORD_HASH_WORKERS}"
+    )
+
+    timings = []
+    for _ in range(args.samples):
+        start = time.perf_counter()
+        hashed = passwords.password_helper.hash("BenchPassw0rd")
+        timings.append(time.perf_counter() - start)
+    print(f"hash: median {statistics.median(timings) * 1000:.1f}ms, max {max(timings) * 1000:.1f}ms")
+
+    async def inline():
+        await asyncio.sleep(0)
+        return passwords.password_helper.verify_and_update("BenchPassw0rd", hashed)
+
+    async def pooled():
+        return await passwords.verify_and_update_password("BenchPassw0rd", hashed)
+
+    for label, verify in (("inline", inline), ("pooled", pooled)):
+        lags = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_loop(stop, lags))
+        start = time.perf_counter()
+        await asyncio.gather(*(verify() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+        print(
+            f"{label}: {args.logins} logins in {elapsed:.2f}s ({args.logins / elapsed:.1f}/s), "
+            f"worst loop stall {max(lags or [0]) * 1000:.0f}ms"
+        )
+
+    passwords.shutdown_executor()
+
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Replay a realistic request mix against the API and record latency per endpoint.
+
+    python -m bench.load --database-url sqlite+aiosqlite:///./bench.db --duration 30 --concurrency 32
+
+Without --url the app runs in-process with a fake storage backend, so only the
+API and the database are measured. Seed the database with bench.seed first.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from contextlib import asynccontextmanager
+
+import httpx
+
+from bench.seed import BENCH_PASSWORD, caption
+from bench.report import parse_query_metrics, summarize, save_result, print_summary, RESULTS_DIR
+
+DEFAULT_MIX = "feed=50,feed_hot=5,timeline=10,likes=10,like=10,comment=8,comments=5,upload=2"
+
+# operation -> (method, route template) as reported on /metrics. Operations
+# sharing a route (feed and feed_hot) only get a combined queries/request.
+ROUTES = {
+    "feed": ("GET", "/feed"),
+    "feed_hot": ("GET", "/feed"),
+    "timeline": ("GET", "/timeline"),
+    "likes": ("GET", "/posts/{post_id}/likes"),
+    "like": ("POST", "/posts/{post_id}/like"),
+    "unlike": ("DELETE", "/posts/{post_id}/like"),
+    "comment": ("POST", "/posts/{post_id}/comment"),
+    "comments": ("GET", "/posts/{post_id}/comments"),
+    "upload": ("POST", "/upload"),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the FeedApp API")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20, help="seeded users to log in as")
+    parser.add_argument("--feed-limit", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--storage-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", default=str(RESULTS_DIR))
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def parse_mix(raw: str):
+    operations, weights = [], []
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        operations.append(name)
+        weights.append(float(weight or 1))
+    return operations, weights
+
+
+@asynccontextmanager
+async def open_client(args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+            yield client
+        return
+
+    os.environ["DATABASE_URL"] = args.database_url
+    # Every simulated user shares one client address; measure the API, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    # Storage cleanup isn't part of the measured mix and must never touch real media
+    os.environ["REAPER_ENABLED"] = "false"
+    os.environ["RECONCILE_ENABLED"] = "false"
+    from bench.fake_storage import install
+    install(latency_ms=args.storage_latency_ms)
+    from app.app import app
+    from app.db import engine
+
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+                yield client
+    finally:
+        await engine.dispose()
+
+
+class Driver:
+    def __init__(self, client: httpx.AsyncClient, args, rng: random.Random):
+        self.client = client
+        self.args = args
+        self.rng = rng
+        self.tokens = []
+        self.post_ids = []
+        self.liked = set()
+        self.samples = []
+
+    async def prepare(self):
+        for i in range(self.args.users):
+            response = await self.client.post(
+                "/auth/jwt/login", data={"username": f"bench{i}@example.com", "password": BENCH_PASSWORD}
+            )
+            if response.status_code == 200:
+                self.tokens.append(response.json()["access_token"])
+        if not self.tokens:
+            raise SystemExit("could not log in any bench users; run bench.seed first")
+
+        response = await self.client.get("/feed", params={"limit": 100})
+        self.post_ids = [post["id"] for post in response.json()["posts"]]
+        if not self.post_ids:
+            raise SystemExit("no posts to exercise; run bench.seed first")
+
+    async def run_operation(self, operation: str):
+        worker = self.rng.randrange(len(self.tokens))
+        headers = {"Authorization": f"Bearer {self.tokens[worker]}"}
+        post_id = self.rng.choice(self.post_ids)
+
+        if operation == "feed":
+            return operation, self.client.get("/feed", params={"limit": self.args.feed_limit})
+        if operation == "feed_hot":
+            return operation, self.client.get("/feed", params={"sort": "hot", "limit": self.args.feed_limit})
+        if operation == "timeline":
+            return operation, self.client.get("/timeline", params={"limit": self.args.feed_limit}, headers=headers)
+        if operation == "likes":
+            return operation, self.client.get(f"/posts/{post_id}/likes")
+        if operation == "comments":
+            return operation, self.client.get(f"/posts/{post_id}/comments")
+        if operation == "like":
+            # Toggle so repeated picks of the same post exercise both paths
+            if (worker, post_id) in self.liked:
+                self.liked.discard((worker, post_id))
+                return "unlike", self.client.delete(f"/posts/{post_id}/like", headers=headers)
+            self.liked.add((worker, post_id))
+            return operation, self.client.post(f"/posts/{post_id}/like", headers=headers)
+        if operation == "comment":
+            return operation, self.client.post(
+                f"/posts/{post_id}/comment", data={"content": caption(self.rng)}, headers=headers
+            )
+        if operation == "upload":
+            return operation, self.client.post(
+                "/upload",
+                # A JPEG signature so the upload passes the server's type check
+                files={"file": ("bench.jpg", b"\xff\xd8\xff\xe0" + os.urandom(64 * 1024), "image/jpeg")},
+                data={"caption": caption(self.rng)},
+                headers=headers,
+            )
+        raise ValueError(operation)
+
+    async def worker(self, operations, weights, deadline: float):
+        while time.perf_counter() < deadline:
+            operation, request = await self.run_operation(self.rng.choices(operations, weights)[0])
+            start = time.perf_counter()
+            try:
+                response = await request
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            self.samples.append((operation, time.perf_counter() - start, status))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    operations, weights = parse_mix(args.mix)
+
+    async with open_client(args) as client:
+        driver = Driver(client, args, rng)
+        await driver.prepare()
+
+        before = parse_query_metrics((await client.get("/metrics")).text)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(driver.worker(operations, weights, deadline) for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+        after = parse_query_metrics((await client.get("/metrics")).text)
+
+    summary = summarize(driver.samples, duration, ROUTES, before, after)
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "database_url")}
+    config["target"] = args.url or args.database_url.split("://")[0]
+    return summary, config
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.url and not args.database_url:
+        raise SystemExit("--url or --database-url is required")
+
+    summary, config = asyncio.run(run(args))
+    path = save_result(summary, config, directory=Path(args.output))
+    print_summary({**summary, "revision": ""})
+    print(f"saved {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
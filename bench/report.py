@@ -0,0 +1,180 @@
+"""Summarize load-test samples and compare saved results.
+
+    python -m bench.report show bench/results/<file>.json
+    python -m bench.report compare bench/results/<old>.json bench/results/<new>.json
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+METRIC_LINE = re.compile(r'^(http_request_db_queries_(?:sum|count))\{method="([^"]*)",route="([^"]*)"\} (\S+)$')
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_query_metrics(text: str) -> dict:
+    """Return {(method, route): (query_sum, request_count)} from a /metrics payload."""
+    totals = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, method, route, value = match.groups()
+        query_sum, count = totals.get((method, route), (0.0, 0.0))
+        if name.endswith("_sum"):
+            query_sum = float(value)
+        else:
+            count = float(value)
+        totals[(method, route)] = (query_sum, count)
+    return totals
+
+
+def summarize(samples, duration: float, routes: dict, before_metrics: dict, after_metrics: dict) -> dict:
+    """samples are (operation, seconds, status) tuples; routes maps operation to (method, route)."""
+    by_op = {}
+    for operation, seconds, status in samples:
+        by_op.setdefault(operation, []).append((seconds, status))
+
+    # /metrics is labelled by route, so operations on the same route can't be told apart
+    sharing = {}
+    for operation in by_op:
+        sharing.setdefault(routes.get(operation), []).append(operation)
+
+    endpoints = {}
+    for operation, rows in sorted(by_op.items()):
+        latencies = sorted(seconds for seconds, _ in rows)
+        statuses = {}
+        for _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+
+        queries_per_request = None
+        key = routes.get(operation)
+        if key in after_metrics:
+            query_sum, count = after_metrics[key]
+            old_sum, old_count = before_metrics.get(key, (0.0, 0.0))
+            if count > old_count:
+                queries_per_request = (query_sum - old_sum) / (count - old_count)
+
+        endpoints[operation] = {
+            "requests": len(rows),
+            "errors": errors,
+            "statuses": statuses,
+            "throughput_rps": len(rows) / duration if duration else 0.0,
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "queries_per_request": queries_per_request,
+            # Set when queries_per_request is the average over all of these operations
+            "queries_combined_with": sorted(sharing.get(key, [])) if len(sharing.get(key, [])) > 1 else None,
+        }
+
+    total = len(samples)
+    return {
+        "duration_s": duration,
+        "requests": total,
+        "throughput_rps": total / duration if duration else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_result(summary: dict, config: dict, directory: Path = RESULTS_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    revision = git_revision()
+    result = {
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        **summary,
+    }
+    path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+    path.write_text(json.dumps(result, indent=2))
+    return path
+
+
+def print_summary(result: dict, out=sys.stdout):
+    print(
+        f"{result.get('revision', '')} {result['requests']} requests in {result['duration_s']:.1f}s "
+        f"({result['throughput_rps']:.1f} req/s)",
+        file=out,
+    )
+    header = f"{'endpoint':<16}{'reqs':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}"
+    print(header, file=out)
+    combined = set()
+    for name, stats in result["endpoints"].items():
+        queries = stats["queries_per_request"]
+        shared = stats.get("queries_combined_with")
+        if shared:
+            combined.add("+".join(shared))
+        print(
+            f"{name:<16}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>9.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+            f"{(f'{queries:.1f}' if queries is not None else '-'):>7}{'*' if shared and queries is not None else ''}",
+            file=out,
+        )
+    for group in sorted(combined):
+        print(f"* q/req is combined over {group} (same route on /metrics)", file=out)
+
+
+def compare(old: dict, new: dict, out=sys.stdout):
+    print(f"{old.get('revision')} -> {new.get('revision')}", file=out)
+    print(f"{'endpoint':<16}{'p50 ms':>18}{'p99 ms':>18}{'rps':>18}", file=out)
+
+    def delta(a, b):
+        change = (b - a) / a * 100 if a else 0.0
+        return f"{b:.1f} ({change:+.0f}%)"
+
+    for name in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        a, b = old["endpoints"].get(name), new["endpoints"].get(name)
+        if not a or not b:
+            print(f"{name:<16}{'only in ' + ('new' if b else 'old'):>18}", file=out)
+            continue
+        print(
+            f"{name:<16}{delta(a['p50_ms'], b['p50_ms']):>18}{delta(a['p99_ms'], b['p99_ms']):>18}"
+            f"{delta(a['throughput_rps'], b['throughput_rps']):>18}",
+            file=out,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect load-test results")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show")
+    show.add_argument("result")
+    diff = commands.add_parser("compare")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        print_summary(json.loads(Path(args.result).read_text()))
+    else:
+        compare(json.loads(Path(args.old).read_text()), json.loads(Path(args.new).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Bulk-generate users, posts, likes and comments for benchmarking.
+
+    python -m bench.seed --database-url sqlite+aiosqlite:///./bench.db --users 1000 --posts 100000
+
+Every seeded user can log in as bench<N>@example.com with BENCH_PASSWORD.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone, timedelta
+
+BENCH_PASSWORD = "BenchPassw0rd"
+WORDS = (
+    "sunset beach city night coffee morning friends travel food mountain river "
+    "dog cat music concert street art summer winter rain snow garden book"
+).split()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed the FeedApp database with synthetic data")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--likes-per-post", type=float, default=5.0, help="mean likes per post")
+    parser.add_argument("--comments-per-post", type=float, default=2.0, help="mean comments per post")
+    parser.add_argument("--follows-per-user", type=int, default=0)
+    parser.add_argument("--days", type=int, default=30, help="spread created_at over this many days")
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def caption(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 12)))
+
+
+async def insert_rows(conn, table, rows, batch_size: int):
+    for first in range(0, len(rows), batch_size):
+        await conn.execute(table.insert(), rows[first:first + batch_size])
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = {}
+
+    def add(self, label: str, count: int):
+        self.counts[label] = self.counts.get(label, 0) + count
+        total = sum(self.counts.values())
+        rate = total / max(time.perf_counter() - self.started, 1e-9)
+        parts = ", ".join(f"{k} {v:,}" for k, v in self.counts.items())
+        print(f"\r  {parts} ({rate:,.0f} rows/s)", end="", file=sys.stderr)
+
+    def done(self):
+        print(f"\n  finished in {time.perf_counter() - self.started:.1f}s", file=sys.stderr)
+
+
+async def seed(args):
+    os.environ["DATABASE_URL"] = args.database_url
+    from sqlalchemy import select, insert, update, bindparam
+    from fastapi_users.password import PasswordHelper
+    from app.db import engine, create_db_and_tables, User, Post, Like, Comment, Follow, TimelineEntry
+    from app.partitions import uuid7
+    from app.trending import hot_score
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    span = timedelta(days=args.days).total_seconds()
+    # Hashing is deliberately slow, so every seeded user shares one hash
+    hashed_password = PasswordHelper().hash(BENCH_PASSWORD)
+
+    await create_db_and_tables()
+    progress = Progress()
+
+    user_ids = [uuid.uuid4() for _ in range(args.users)]
+
+    async with engine.begin() as conn:
+        await insert_rows(conn, User.__table__, [
+            {
+                "id": user_id,
+                "email": f"bench{i}@example.com",
+                "username": f"bench{i}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "is_superuser": False,
+                "is_verified": True,
+                "followers_count": 0,
+            }
+            for i, user_id in enumerate(user_ids)
+        ], args.batch_size)
+    progress.add("users", args.users)
+
+    if args.follows_per_user:
+        followers_count = [0] * args.users
+        per_chunk = max(1, args.batch_size // args.follows_per_user)
+        for first in range(0, args.users, per_chunk):
+            rows = []
+            for follower in range(first, min(args.users, first + per_chunk)):
+                for followee in rng.sample(range(args.users), min(args.follows_per_user, args.users)):
+                    if followee == follower:
+                        continue
+                    followers_count[followee] += 1
+                    rows.append({
+                        "id": uuid.uuid4(),
+                        "follower_id": user_ids[follower],
+                        "followee_id": user_ids[followee],
+                        "created_at": now,
+                    })
+            async with engine.begin() as conn:
+                await insert_rows(conn, Follow.__table__, rows, args.batch_size)
+            progress.add("follows", len(rows))
+        async with engine.begin() as conn:
+            await conn.execute(
+                update(User.__table__).where(User.__table__.c.id == bindparam("user_id")),
+                [
+                    {"user_id": user_id, "followers_count": count}
+                    for user_id, count in zip(user_ids, followers_count)
+                    if count
+                ],
+            )
+
+    # Posts are generated in chunks, each committed together with its likes and
+    # comments, so memory stays flat no matter how many rows are requested.
+    for first in range(0, args.posts, args.batch_size):
+        posts, likes, comments = [], [], []
+        for _ in range(min(args.batch_size, args.posts - first)):
+            author = rng.randrange(args.users)
+            created_at = now - timedelta(seconds=rng.random() * span)
+            # Time-ordered like the app's own ids on partitioned Postgres
+            post_id = uuid7(created_at)
+            like_count = min(args.users, int(rng.expovariate(1 / args.likes_per_post))) if args.likes_per_post else 0
+            comment_count = int(rng.expovariate(1 / args.comments_per_post)) if args.comments_per_post else 0
+
+            posts.append({
+                "id": post_id,
+                "user_id": user_ids[author],
+                "username": f"bench{author}",
+                "imagekit_file_id": uuid.uuid4().hex,
+                "caption": caption(rng),
+                "url": f"https://fake-storage.local/{post_id.hex}.jpg",
+                "file_type": "image",
+                "file_name": f"{post_id.hex}.jpg",
+                "created_at": created_at,
+                "likes_count": like_count,
+                "comments_count": comment_count,
+                "hot_score": hot_score(like_count, comment_count, created_at, now),
+            })
+            for liker in rng.sample(range(args.users), like_count):
+                likes.append({"id": uuid.uuid4(), "post_id": post_id, "user_id": user_ids[liker], "created_at": created_at})
+            for _ in range(comment_count):
+                commenter = rng.randrange(args.users)
+                comments.append({
+                    "id": uuid.uuid4(),
+                    "post_id": post_id,
+                    "user_id": user_ids[commenter],
+                    "username": f"bench{commenter}",
+                    "content": caption(rng),
+                    "created_at": created_at,
+                })
+
+        async with engine.begin() as conn:
+            await insert_rows(conn, Post.__table__, posts, args.batch_size)
+            await insert_rows(conn, Like.__table__, likes, args.batch_size)
+            await insert_rows(conn, Comment.__table__, comments, args.batch_size)
+        progress.add("posts", len(posts))
+        progress.add("likes", len(likes))
+        progress.add("comments", len(comments))
+
+    if args.follows_per_user:
+        # Materialize home timelines the same way the fan-out worker would
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                insert(TimelineEntry.__table__).from_select(
+                    ["user_id", "created_at", "post_id", "author_id"],
+                    select(Follow.follower_id, Post.created_at, Post.id, Post.user_id)
+                    .join(Post, Post.user_id == Follow.followee_id)
+                    .union_all(select(Post.user_id, Post.created_at, Post.id, Post.user_id)),
+                )
+            )
+        progress.add("timeline", max(result.rowcount, 0))
+
+    progress.done()
+    await engine.dispose()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database_url:
+        raise SystemExit("--database-url or DATABASE_URL is required")
+    asyncio.run(seed(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -21,13 +21,24 @@ st.markdown("""
 
 st.title("📝 Feed")
 
-response = requests.get(f"{API_URL}/feed")
+PAGE_SIZE = 20
 
-if response.status_code != 200:
-    st.error("Failed to load feed")
-    st.stop()
+# The API pages /feed; "Load more" fetches one more page on the next run
+if "feed_pages" not in st.session_state:
+    st.session_state.feed_pages = 1
 
-posts = response.json()["posts"]
+posts = []
+has_more = False
+for page in range(st.session_state.feed_pages):
+    response = requests.get(f"{API_URL}/feed", params={"limit": PAGE_SIZE, "offset": page * PAGE_SIZE})
+    if response.status_code != 200:
+        st.error("Failed to load feed")
+        st.stop()
+    page_posts = response.json()["posts"]
+    posts.extend(page_posts)
+    has_more = len(page_posts) == PAGE_SIZE
+    if not has_more:
+        break
 
 if not posts:
     st.info("No posts yet")
@@ -176,6 +187,9 @@ for post in posts:
     
     st.markdown("<div class='post-divider'></div>", unsafe_allow_html=True)
 
+if has_more and st.button("Load more", use_container_width=True):
+    st.session_state.feed_pages += 1
+    st.rerun()
 
     
 
@@ -11,20 +11,79 @@ if "token" not in st.session_state:
 
 st.title("📤 Upload")
 
-file = st.file_uploader("Image / Video", type=["jpg", "png", "mp4", "mov"])
-caption = st.text_input("Caption")
+files = st.file_uploader("Images / Videos", type=["jpg", "png", "mp4", "mov"], accept_multiple_files=True)
+captions = [st.text_input(f"Caption for {file.name}", key=f"caption-{i}-{file.name}") for i, file in enumerate(files or [])]
 
-if st.button("Upload"):
-    if not file:
-        st.warning("Select a file")
+
+def upload_single(file, caption):
+    # Ask the API for a signed upload session, send the bytes straight to storage,
+    # then let the API create the post from the stored file
+    session_response = requests.post(
+        f"{API_URL}/uploads/session",
+        headers=get_headers(),
+        data={"file_name": file.name, "content_type": file.type, "size": file.size},
+    )
+    if session_response.status_code != 200:
+        st.error(f"Upload failed: {session_response.text}")
         st.stop()
     
+    upload_session = session_response.json()
+    upload = upload_session["upload"]
+    file_id = None
+    
+    if upload["method"] == "PUT":
+        storage_response = requests.put(upload["url"], data=file, headers=upload["headers"])
+    else:
+        storage_response = requests.post(
+            upload["url"],
+            data=upload["fields"],
+            files={"file": (file.name, file, file.type)},
+        )
+        if storage_response.status_code == 200:
+            file_id = storage_response.json().get("fileId")
+    
+    if storage_response.status_code != 200:
+        st.error(f"Upload failed: {storage_response.text}")
+        st.stop()
+    
+    response = requests.post(
+        f"{API_URL}/uploads/finalize",
+        headers=get_headers(),
+        data={"session_token": upload_session["session_token"], "file_id": file_id, "caption": caption},
+    )
+    if response.status_code != 200:
+        st.error(f"Upload failed: {response.text}")
+        st.stop()
+
+
+def upload_album(files, captions):
+    # One request for the whole album; the API pushes the files to storage concurrently
     response = requests.post(
-        f"{API_URL}/upload",
+        f"{API_URL}/uploads:batch",
         headers=get_headers(),
-        files={"file": (file.name, file, file.type)},
-        data={"caption": caption},
+        files=[("files", (file.name, file, file.type)) for file in files],
+        data={"captions": captions},
     )
+    if response.status_code != 200:
+        st.error(f"Upload failed: {response.text}")
+        st.stop()
+    
+    failed = [result for result in response.json()["results"] if not result["ok"]]
+    for result in failed:
+        st.error(f"{result['file_name']}: {result['error']}")
+    if failed:
+        st.stop()
+
+
+if st.button("Upload"):
+    if not files:
+        st.warning("Select a file")
+        st.stop()
+    
+    if len(files) == 1:
+        upload_single(files[0], captions[0])
+    else:
+        upload_album(files, captions)
     
     st.success("Uploaded successfully....")
     time.sleep(2)
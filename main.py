@@ -1,4 +1,77 @@
+import os
+import asyncio
+import logging
+import argparse
+import importlib.util
 import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def shared_state_configured():
+    # The event bus and rate limiter are in-process unless backed by a shared store
+    rate_limits_shared = (
+        os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "true" or bool(os.getenv("RATE_LIMIT_STORE_URL"))
+    )
+    return bool(os.getenv("EVENT_BROKER_URL")) and rate_limits_shared
+
+
+def default_workers():
+    if not shared_state_configured():
+        return 1
+    # One event loop per core; the app is async so more processes only add contention
+    return max(1, len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the FeedApp API server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or default_workers())
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", "2048")))
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE_SECONDS", "30")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30")))
+    parser.add_argument("--reload", action="store_true", help="single process with auto-reload, for development")
+    return parser.parse_args()
+
+
+def create_schema():
+    from app.db import create_db_and_tables, engine
+
+    async def run():
+        await create_db_and_tables()
+        await engine.dispose()
+
+    asyncio.run(run())
+
 
 if __name__ == "__main__":
-    uvicorn.run(app="app.app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    args = parse_args()
+
+    if args.reload:
+        uvicorn.run(app="app.app:app", host=args.host, port=args.port, reload=True)
+    else:
+        if args.workers > 1 and not shared_state_configured():
+            logging.warning(
+                "Running %d workers without EVENT_BROKER_URL and RATE_LIMIT_STORE_URL: live events only reach "
+                "clients on the same worker and every worker enforces its own rate limits",
+                args.workers,
+            )
+        # Create the schema once here instead of racing it in every worker's lifespan
+        create_schema()
+        os.environ["CREATE_SCHEMA_ON_STARTUP"] = "false"
+
+        uvicorn.run(
+            app="app.app:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+            http="httptools" if importlib.util.find_spec("httptools") else "h11",
+            backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            proxy_headers=True,
+            access_log=os.getenv("ACCESS_LOG", "false").lower() == "true",
+        )